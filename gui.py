@@ -1,19 +1,23 @@
 #!/usr/bin/env python3
+import time
+STARTUP_T0 = time.perf_counter()
+
 import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gtk, Gio, GdkPixbuf, GLib, Gdk
 import os
+import sys
 from pathlib import Path
 import threading
-from PIL import Image, ImageOps
 import io
-import subprocess
-import configparser
-import json
-import requests # Added for future geotagging
+import importlib
 
-# Import our backend engine
-import photoflow as core_engine
+# Everything heavier (PIL, NumPy, the photoflow engine, subprocess, configparser...)
+# is imported inside the functions that use it, so the window can appear first.
+# warm_up_modules() pulls the engine in on a background thread right after the first frame.
+IMPORTS_DONE = time.perf_counter()
+HEAVY_MODULES = ['PIL', 'numpy', 'migrator', 'photoflow', 'photoindex', 'rawdev', 'readorder', 'renditions', 'scoring', 'similarity', 'thumbcache',
+                 'subprocess', 'configparser', 'sqlite3', 'multiprocessing']
 
 SUPPORTED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.dng']
 RAW_EXTENSIONS = ['.dng']
@@ -21,13 +25,39 @@ RAW_EXTENSIONS = ['.dng']
 # Define path for our persistent tag file
 TAG_CONFIG_DIR = Path.home() / ".config" / "PhotoFlow"
 TAG_FILE = TAG_CONFIG_DIR / "tags.txt"
+CONFIG_FILE = Path(__file__).parent.resolve() / 'config.ini'
+# Same order as planner.COLLISION_POLICIES; duplicated so Preferences doesn't import the engine.
+COLLISION_POLICIES = ['skip', 'rename', 'overwrite']
+# Same keys as renditions.FORMATS / renditions.PRESETS, with their Preferences labels.
+RENDITION_FORMATS = [('jpeg', "JPEG"), ('progressive-jpeg', "Progressive JPEG"), ('webp', "WebP"), ('avif', "AVIF")]
+RENDITION_PRESETS = [('fast', "Fast"), ('balanced', "Balanced"), ('small', "Smallest")]
+
+# Grid sort options: (label, photoindex column, descending). Photos missing the value always sort last.
+SORT_OPTIONS = [
+    ("Folder Order", 'load_index', False),
+    ("Name", 'name', False),
+    ("Capture Time", 'captured', False),
+    ("Camera", 'camera', False),
+    ("Rating", 'rating', True),
+    ("Resolution", 'pixels', True),
+    ("Best Score", 'score', True),
+    ("Sharpness", 'sharpness', True),
+    ("Subject Focus", 'subject_focus', True),
+    ("Clipped Highlights", 'clipped_highlights', True),
+    ("Clipped Shadows", 'clipped_shadows', True),
+]
+# Grid filters: (label, photoindex.FILTERS key)
+FILTER_OPTIONS = [("All Photos", 'all'), ("RAW+JPG Pairs", 'raw+jpg'), ("With RAW", 'raw'), ("JPG Only", 'jpg')]
 
 class ThumbnailWidget(Gtk.Box):
     def __init__(self, pixbuf, filename, badge_text=None, jpg_path=None, raw_path=None):
         super().__init__(orientation=Gtk.Orientation.VERTICAL, spacing=6)
         self.add_css_class("thumbnail-widget")
+        self.base_name = filename
         self.jpg_path = jpg_path
         self.raw_path = raw_path
+        self.load_index = 0 # Row id in the window's PhotoIndex
+        self.scores = None
         overlay = Gtk.Overlay()
         image = Gtk.Image.new_from_pixbuf(pixbuf)
         overlay.set_child(image)
@@ -37,13 +67,43 @@ class ThumbnailWidget(Gtk.Box):
             badge.set_halign(Gtk.Align.END); badge.set_valign(Gtk.Align.END)
             badge.set_margin_end(4); badge.set_margin_bottom(4)
             overlay.add_overlay(badge)
+        # Shown on the best frame of a burst; toggles the rest of the group.
+        self.group_button = Gtk.Button(visible=False, halign=Gtk.Align.START, valign=Gtk.Align.START)
+        self.group_button.add_css_class("group-badge")
+        self.group_button.set_margin_start(4); self.group_button.set_margin_top(4)
+        overlay.add_overlay(self.group_button)
         filename_label = Gtk.Label.new(filename)
         filename_label.set_wrap(True)
+        self.score_label = Gtk.Label(visible=False)
+        self.score_label.add_css_class("dim-label")
         self.append(overlay)
         self.append(filename_label)
+        self.append(self.score_label)
     
     def set_display_size(self, size):
         self.get_first_child().get_child().set_pixel_size(size)
+    
+    def set_group_state(self, hidden_count, expanded):
+        self.group_button.set_label("−" if expanded else f"+{hidden_count}")
+        self.group_button.set_tooltip_text("Collapse group" if expanded else "Expand group")
+        self.group_button.set_visible(True)
+    
+    def set_scores(self, scores):
+        self.scores = scores
+        clipped = max(scores['clipped_highlights'], scores['clipped_shadows'])
+        self.score_label.set_text(f"★ {scores['score']:.1f} · clip {clipped:.0%}")
+        self.score_label.set_tooltip_text(
+            f"Sharpness: {scores['sharpness']:.0f}\n"
+            f"Subject focus: {scores.get('subject_focus', 0):.0f}\n"
+            f"Clipped highlights: {scores['clipped_highlights']:.1%}\n"
+            f"Clipped shadows: {scores['clipped_shadows']:.1%}")
+        self.score_label.set_visible(True)
+
+class ThumbnailChild(Gtk.FlowBoxChild):
+    """Grid cell holding a ThumbnailWidget, carrying its photo index row for the sort and filter funcs."""
+    def __init__(self, thumbnail):
+        super().__init__(child=thumbnail)
+        self.load_index = thumbnail.load_index
 
 class ReviewWindow(Gtk.Window):
     def __init__(self, parent, selection_data, batch_settings, tag_model):
@@ -130,6 +190,8 @@ class ReviewWindow(Gtk.Window):
         self.load_current_photo()
     
     def _get_exif_gps(self, file_path):
+        import json
+        import subprocess
         try:
             command = ['exiftool', '-json', '-GPSLatitude', '-GPSLongitude', str(file_path)]
             result = subprocess.run(command, check=True, capture_output=True, text=True)
@@ -152,6 +214,8 @@ class ReviewWindow(Gtk.Window):
         data['user_comment'] = self.comment_buffer.get_text(start_iter, end_iter, True)
             
     def load_current_photo(self):
+        from PIL import ImageOps
+        import photoflow as core_engine
         if self.current_index < 0 or self.current_index >= len(self.selection_data):
             return
             
@@ -159,15 +223,8 @@ class ReviewWindow(Gtk.Window):
         path_to_load = data['jpg_path'] or data['raw_path']
         
         try:
-            img_data = None
-            if Path(path_to_load).suffix.lower() in RAW_EXTENSIONS:
-                command = ['exiftool', '-b', '-PreviewImage', str(path_to_load)]
-                result = subprocess.run(command, capture_output=True, check=True)
-                img_data = result.stdout
-            else:
-                with open(path_to_load, 'rb') as f: img_data = f.read()
-            if img_data:
-                img = Image.open(io.BytesIO(img_data))
+            img = core_engine.open_source_image(Path(path_to_load))
+            if img:
                 img = ImageOps.exif_transpose(img)
                 temp_file = "/tmp/photoflow_preview.jpg"
                 img.save(temp_file, "JPEG", quality=90)
@@ -230,9 +287,14 @@ class ReviewWindow(Gtk.Window):
 class PreferencesWindow(Gtk.Window):
     def __init__(self, parent):
         super().__init__(title="Preferences", transient_for=parent, modal=True)
-        self.config_path = Path(__file__).parent.resolve() / 'config.ini'
+        import configparser
+        self.parent_window = parent
+        self.config_path = CONFIG_FILE
         self.config = configparser.ConfigParser()
         self.config.read(self.config_path)
+        import renditions
+        # Only the formats this Pillow build can write.
+        self.rendition_formats = [(key, label) for key, label in RENDITION_FORMATS if key in renditions.available_formats()]
 
         self.set_default_size(600, 400)
         
@@ -247,14 +309,18 @@ class PreferencesWindow(Gtk.Window):
         
         self.dest_entry = Gtk.Entry()
         self.obsidian_entry = Gtk.Entry()
+        self.staging_entry = Gtk.Entry(placeholder_text="Fast local disk; empty = write straight to the archive")
         
         self.dest_entry.set_hexpand(True)
         self.obsidian_entry.set_hexpand(True)
+        self.staging_entry.set_hexpand(True)
         
         paths_grid.attach(Gtk.Label.new("Archive Path:"), 0, 0, 1, 1)
         paths_grid.attach(self.dest_entry, 1, 0, 1, 1)
         paths_grid.attach(Gtk.Label.new("Obsidian Path:"), 0, 1, 1, 1)
         paths_grid.attach(self.obsidian_entry, 1, 1, 1, 1)
+        paths_grid.attach(Gtk.Label.new("Staging Path:"), 0, 2, 1, 1)
+        paths_grid.attach(self.staging_entry, 1, 2, 1, 1)
         
         settings_frame = Gtk.Frame(label="Resize Settings")
         settings_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6,
@@ -269,6 +335,45 @@ class PreferencesWindow(Gtk.Window):
         settings_box.append(Gtk.Label.new("Height:"))
         settings_box.append(self.height_spinner)
         
+        raw_frame = Gtk.Frame(label="RAW Development")
+        self.raw_full_quality_check = Gtk.CheckButton(label="Develop RAW files at full quality (slower)",
+                                                      margin_start=12, margin_end=12, margin_top=6, margin_bottom=12)
+        raw_frame.set_child(self.raw_full_quality_check)
+        
+        collision_frame = Gtk.Frame(label="Name Collisions")
+        collision_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6,
+                                  margin_start=12, margin_end=12, margin_top=6, margin_bottom=12)
+        collision_frame.set_child(collision_box)
+        self.collision_dropdown = Gtk.DropDown.new_from_strings(["Skip the photo", "Rename (append _2, _3...)", "Overwrite"])
+        collision_box.append(Gtk.Label.new("When a destination file already exists:"))
+        collision_box.append(self.collision_dropdown)
+        
+        rendition_frame = Gtk.Frame(label="Rendition Format")
+        rendition_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6,
+                                  margin_start=12, margin_end=12, margin_top=6, margin_bottom=12)
+        rendition_frame.set_child(rendition_box)
+        format_row = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        self.format_dropdown = Gtk.DropDown.new_from_strings([label for key, label in self.rendition_formats])
+        self.preset_dropdown = Gtk.DropDown.new_from_strings([label for key, label in RENDITION_PRESETS])
+        benchmark_button = Gtk.Button(label="Benchmark on Loaded Photos")
+        benchmark_button.connect('clicked', self.on_benchmark_clicked)
+        format_row.append(Gtk.Label.new("Format:"))
+        format_row.append(self.format_dropdown)
+        format_row.append(Gtk.Label.new("Encoder:"))
+        format_row.append(self.preset_dropdown)
+        format_row.append(benchmark_button)
+        self.benchmark_label = Gtk.Label(xalign=0, selectable=True, css_classes=['monospace'])
+        rendition_box.append(format_row)
+        rendition_box.append(self.benchmark_label)
+        
+        server_frame = Gtk.Frame(label="Job Server")
+        server_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6,
+                                  margin_start=12, margin_end=12, margin_top=6, margin_bottom=12)
+        server_frame.set_child(server_box)
+        self.server_entry = Gtk.Entry(hexpand=True, placeholder_text="http://nas:8765 or unix:/run/photoflow.sock (empty = process locally)")
+        server_box.append(Gtk.Label.new("Server:"))
+        server_box.append(self.server_entry)
+        
         save_button = Gtk.Button(label="Save and Close", css_classes=['suggested-action'])
         save_button.connect('clicked', self.on_save_clicked)
         save_button.set_halign(Gtk.Align.END)
@@ -277,6 +382,10 @@ class PreferencesWindow(Gtk.Window):
         
         main_box.append(paths_frame)
         main_box.append(settings_frame)
+        main_box.append(raw_frame)
+        main_box.append(collision_frame)
+        main_box.append(rendition_frame)
+        main_box.append(server_frame)
         main_box.append(save_button)
         
         self.load_settings()
@@ -284,26 +393,129 @@ class PreferencesWindow(Gtk.Window):
     def load_settings(self):
         self.dest_entry.set_text(self.config.get('Paths', 'DestinationDirectory', fallback=""))
         self.obsidian_entry.set_text(self.config.get('Paths', 'ObsidianVaultPicturesDirectory', fallback=""))
+        self.staging_entry.set_text(self.config.get('Paths', 'StagingDirectory', fallback=""))
         self.width_spinner.set_value(self.config.getint('Settings', 'ResizeWidth', fallback=1600))
         self.height_spinner.set_value(self.config.getint('Settings', 'ResizeHeight', fallback=1600))
+        self.raw_full_quality_check.set_active(self.config.getboolean('Settings', 'RawFullQuality', fallback=False))
+        self.server_entry.set_text(self.config.get('Server', 'JobServerUrl', fallback=""))
+        policy = self.config.get('Settings', 'OnCollision', fallback='skip')
+        self.collision_dropdown.set_selected(COLLISION_POLICIES.index(policy) if policy in COLLISION_POLICIES else 0)
+        rendition_format = self.config.get('Settings', 'RenditionFormat', fallback='jpeg')
+        format_keys = [key for key, label in self.rendition_formats]
+        self.format_dropdown.set_selected(format_keys.index(rendition_format) if rendition_format in format_keys else 0)
+        if rendition_format not in format_keys:
+            self.benchmark_label.set_text(f"This Pillow build can't write {rendition_format.upper()}; renditions are written as JPEG.")
+        preset = self.config.get('Settings', 'RenditionPreset', fallback='balanced')
+        preset_keys = [key for key, label in RENDITION_PRESETS]
+        self.preset_dropdown.set_selected(preset_keys.index(preset) if preset in preset_keys else 1)
+
+    def on_benchmark_clicked(self, widget):
+        # A sample of the photos loaded in the main window; RAWs are preferred as they are the usual source.
+        thumbnails = list(self.parent_window.thumbnails_by_name.values())[:8] if self.parent_window else []
+        sample = [t.raw_path or t.jpg_path for t in thumbnails]
+        if not sample:
+            self.benchmark_label.set_text("Load a folder of photos first.")
+            return
+        widget.set_sensitive(False)
+        self.benchmark_label.set_text(f"Encoding {len(sample)} photos in every format...")
+        size = (int(self.width_spinner.get_value()), int(self.height_spinner.get_value()))
+        threading.Thread(target=self.benchmark_thread_worker, args=(sample, size, widget), daemon=True).start()
+
+    def benchmark_thread_worker(self, sample, size, button):
+        import renditions
+        try:
+            text = renditions.format_benchmark(renditions.benchmark(sample, size))
+            unavailable = [label for key, label in RENDITION_FORMATS if key not in renditions.available_formats()]
+            if unavailable:
+                text += f"\nNot supported by this Pillow build: {', '.join(unavailable)}"
+        except Exception as e:
+            text = f"Benchmark failed: {e}"
+        finally:
+            GLib.idle_add(button.set_sensitive, True)
+        GLib.idle_add(self.benchmark_label.set_text, text)
 
     def on_save_clicked(self, widget):
         self.config['Paths']['DestinationDirectory'] = self.dest_entry.get_text()
         self.config['Paths']['ObsidianVaultPicturesDirectory'] = self.obsidian_entry.get_text()
+        self.config['Paths']['StagingDirectory'] = self.staging_entry.get_text().strip()
         self.config['Settings']['ResizeWidth'] = str(int(self.width_spinner.get_value()))
         self.config['Settings']['ResizeHeight'] = str(int(self.height_spinner.get_value()))
+        self.config['Settings']['RawFullQuality'] = 'yes' if self.raw_full_quality_check.get_active() else 'no'
+        self.config['Settings']['OnCollision'] = COLLISION_POLICIES[self.collision_dropdown.get_selected()]
+        self.config['Settings']['RenditionFormat'] = self.rendition_formats[self.format_dropdown.get_selected()][0]
+        self.config['Settings']['RenditionPreset'] = RENDITION_PRESETS[self.preset_dropdown.get_selected()][0]
+        if not self.config.has_section('Server'): self.config.add_section('Server')
+        self.config['Server']['JobServerUrl'] = self.server_entry.get_text().strip()
         
         with open(self.config_path, 'w') as configfile:
             self.config.write(configfile)
+        if self.parent_window and self.parent_window.get_application():
+            self.parent_window.get_application().config = self.config
             
         print("Preferences saved.")
         self.close()
 
+class PlanWindow(Gtk.Window):
+    """Shows an ingest plan as a dry run, and lets the user save or execute it."""
+    def __init__(self, parent, plan, new_tags):
+        super().__init__(title="Ingest Plan (Dry Run)", transient_for=parent, modal=True)
+        import planner
+        self.parent_window = parent
+        self.plan = plan
+        self.new_tags = new_tags
+        self.set_default_size(900, 600)
+        
+        main_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=12,
+                           margin_start=12, margin_end=12, margin_top=12, margin_bottom=12)
+        self.set_child(main_box)
+        
+        scrolled = Gtk.ScrolledWindow(vexpand=True)
+        plan_view = Gtk.TextView(editable=False, monospace=True, cursor_visible=False)
+        plan_view.get_buffer().set_text(planner.format_plan(plan), -1)
+        scrolled.set_child(plan_view)
+        main_box.append(scrolled)
+        
+        button_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6, halign=Gtk.Align.END)
+        save_button = Gtk.Button(label="Save Plan...")
+        save_button.connect('clicked', self.on_save_clicked)
+        execute_button = Gtk.Button(label="Execute Plan", css_classes=['suggested-action'])
+        execute_button.set_sensitive(bool(plan['items']))
+        execute_button.connect('clicked', self.on_execute_clicked)
+        button_box.append(save_button); button_box.append(execute_button)
+        main_box.append(button_box)
+    
+    def on_save_clicked(self, widget):
+        dialog = Gtk.FileChooserDialog(title="Save ingest plan", transient_for=self, action=Gtk.FileChooserAction.SAVE)
+        dialog.add_buttons("_Cancel", Gtk.ResponseType.CANCEL, "_Save", Gtk.ResponseType.OK)
+        dialog.set_current_name("photoflow-plan.json")
+        dialog.connect("response", self.on_save_dialog_response)
+        dialog.present()
+    
+    def on_save_dialog_response(self, dialog, response):
+        import planner
+        if response == Gtk.ResponseType.OK:
+            path = dialog.get_file().get_path()
+            planner.save_plan(self.plan, path)
+            print(f"💾 Plan saved to {path}. Run it later with: python3 planner.py execute {path}")
+        dialog.destroy()
+    
+    def on_execute_clicked(self, widget):
+        self.parent_window.start_plan_execution(self.plan, self.new_tags)
+        self.close()
+
 class PhotoFlowWindow(Gtk.ApplicationWindow):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
         self.last_source_folder_path = None
+        self.thumbnails_by_name = {}
+        self.burst_groups = []
+        self.group_widgets = []
+        # Created on the first folder load so NumPy stays off the startup path.
+        self.photo_index = None
+        self.sort_ranks = None
+        self.visible_rows = None
+        self.index_refresh_pending = False
         
         self.set_title("PhotoFlow")
         self.set_default_size(1200, 800)
@@ -319,6 +531,15 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
         self.size_slider.set_size_request(150, -1)
         self.size_slider.connect("value-changed", self.on_thumbnail_size_changed)
         header.pack_start(self.size_slider)
+        self.sort_dropdown = Gtk.DropDown.new_from_strings([label for label, key, descending in SORT_OPTIONS])
+        self.sort_dropdown.connect("notify::selected", lambda dropdown, param: self.refresh_grid_order())
+        header.pack_start(self.sort_dropdown)
+        self.filter_dropdown = Gtk.DropDown.new_from_strings([label for label, key in FILTER_OPTIONS])
+        self.filter_dropdown.connect("notify::selected", lambda dropdown, param: self.refresh_grid_filter())
+        header.pack_start(self.filter_dropdown)
+        self.gps_filter_button = Gtk.ToggleButton(label="Has GPS")
+        self.gps_filter_button.connect("toggled", lambda button: self.refresh_grid_filter())
+        header.pack_start(self.gps_filter_button)
         header.pack_end(menu_button)
         
         main_grid = Gtk.Grid(margin_start=12, margin_end=12, margin_top=12, margin_bottom=12, row_spacing=12, column_spacing=12)
@@ -328,10 +549,32 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
         scrolled_window.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
         self.thumbnail_view = Gtk.FlowBox(valign=Gtk.Align.START, max_children_per_line=10, min_children_per_line=3, selection_mode=Gtk.SelectionMode.MULTIPLE)
         self.thumbnail_view.connect("selected-children-changed", self.on_selection_changed)
+        self.thumbnail_view.set_sort_func(self.sort_thumbnails)
+        self.thumbnail_view.set_filter_func(self.filter_thumbnail)
         scrolled_window.set_child(self.thumbnail_view)
         
         main_grid.attach(scrolled_window, 0, 1, 3, 1)
         
+        # --- Ingest queue: one row per queued source, ingested concurrently ---
+        queue_frame = Gtk.Frame(label="Ingest Queue")
+        queue_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6, margin_start=12, margin_end=12, margin_top=6, margin_bottom=12)
+        self.queue_grid = Gtk.Grid(row_spacing=4, column_spacing=12)
+        for column, title in enumerate(["Source", "Files", "Devices", "Progress", "Rate"]):
+            header_label = Gtk.Label(label=f"<b>{title}</b>", use_markup=True, halign=Gtk.Align.START)
+            self.queue_grid.attach(header_label, column, 0, 1, 1)
+        queue_buttons = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        self.queue_add_button = Gtk.Button(label="Add Selection to Queue")
+        self.queue_add_button.connect('clicked', self.on_add_to_queue_clicked)
+        self.queue_run_button = Gtk.Button(label="Ingest All", sensitive=False)
+        self.queue_run_button.connect('clicked', self.on_ingest_all_clicked)
+        self.queue_total_label = Gtk.Label(hexpand=True, halign=Gtk.Align.END)
+        queue_buttons.append(self.queue_add_button); queue_buttons.append(self.queue_run_button); queue_buttons.append(self.queue_total_label)
+        queue_box.append(self.queue_grid); queue_box.append(queue_buttons)
+        queue_frame.set_child(queue_box)
+        main_grid.attach(queue_frame, 0, 2, 3, 1)
+        self.ingest_queue = []
+        self.queued_paths = set()  # files already in the ingest queue; their thumbnails are locked
+        
         self.source_button = Gtk.Button(label="Select Source Folder...")
         self.dest_button = Gtk.Button(label="Select Destination Folder...")
         self.source_button.connect('clicked', self.on_select_source_folder)
@@ -356,7 +599,10 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
         self.rename_spinner = Gtk.SpinButton.new_with_range(1, 10000, 1)
         self.batch_process_button = Gtk.Button(label="Process Batch Only")
         self.batch_process_button.connect('clicked', self.on_process_files_clicked)
+        self.plan_button = Gtk.Button(label="Preview Plan (Dry Run)...")
+        self.plan_button.connect('clicked', self.on_preview_plan_clicked)
         rename_box.append(self.rename_entry); rename_box.append(self.rename_spinner); rename_box.append(self.batch_process_button)
+        rename_box.append(self.plan_button)
         rename_frame.set_child(rename_box)
         
         tags_frame = Gtk.Frame(label="Common Tags")
@@ -373,6 +619,14 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
         tags_box.append(self.tags_entry)
         tags_frame.set_child(tags_box)
         
+        cull_frame = Gtk.Frame(label="Auto-Cull")
+        cull_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6, margin_start=12, margin_end=12, margin_top=6, margin_bottom=12)
+        self.best_count_spinner = Gtk.SpinButton.new_with_range(1, 20, 1)
+        self.select_best_button = Gtk.Button(label="Select Best per Group", hexpand=True)
+        self.select_best_button.connect('clicked', self.on_select_best_clicked)
+        cull_box.append(self.best_count_spinner); cull_box.append(self.select_best_button)
+        cull_frame.set_child(cull_box)
+        
         location_frame = Gtk.Frame(label="Batch Location")
         self.gps_button = Gtk.Button(label="Add GPS Data...", margin_start=12, margin_end=12, margin_top=6, margin_bottom=6)
         location_frame.set_child(self.gps_button)
@@ -380,11 +634,22 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
         self.review_button = Gtk.Button(label="Review & Process Individually...", css_classes=['suggested-action'])
         self.review_button.set_valign(Gtk.Align.END); self.review_button.set_vexpand(True)
         self.review_button.connect('clicked', self.on_review_files_clicked)
-        right_panel.append(selection_info_frame); right_panel.append(rename_frame); right_panel.append(tags_frame); right_panel.append(location_frame)
-        right_panel.append(self.obsidian_check); right_panel.append(self.review_button)
-        
+        self.job_progress = Gtk.ProgressBar(show_text=True, visible=False)
+        self.migration_label = Gtk.Label(visible=False, wrap=True)
+        self.migration_status_active = False
+        right_panel.append(selection_info_frame); right_panel.append(rename_frame); right_panel.append(tags_frame); right_panel.append(cull_frame); right_panel.append(location_frame)
+        right_panel.append(self.obsidian_check); right_panel.append(self.job_progress); right_panel.append(self.migration_label); right_panel.append(self.review_button)
+        
+    def selected_unqueued_children(self):
+        """The selected grid children, minus photos already in the ingest queue (Select All can reach them)."""
+        return [child for child in self.thumbnail_view.get_selected_children()
+                if not self.is_queued(child.get_child())]
+    
+    def is_queued(self, thumbnail):
+        return bool({thumbnail.jpg_path, thumbnail.raw_path} & self.queued_paths)
+    
     def on_review_files_clicked(self, widget):
-        selected_flowbox_children = self.thumbnail_view.get_selected_children()
+        selected_flowbox_children = self.selected_unqueued_children()
         if not selected_flowbox_children: return
         selection_data = []
         for child in selected_flowbox_children:
@@ -405,18 +670,16 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
         review_window = ReviewWindow(self, selection_data, batch_settings, app.tag_model)
         review_window.present()
         
-    def on_process_files_clicked(self, widget):
-        selected_flowbox_children = self.thumbnail_view.get_selected_children()
-        if not selected_flowbox_children: return
+    def collect_batch(self):
+        """Returns (selection_data, settings, new_tags, config) for the current selection, or None."""
+        selected_flowbox_children = self.selected_unqueued_children()
+        if not selected_flowbox_children: return None
         selection_data = []
         for child in selected_flowbox_children:
             thumb_widget = child.get_child()
             selection_data.append({'jpg_path': thumb_widget.jpg_path, 'raw_path': thumb_widget.raw_path})
-        config = configparser.ConfigParser()
-        script_dir = Path(__file__).parent.resolve()
-        config_file_path = script_dir / 'config.ini'
-        if not config_file_path.exists(): return
-        config.read(config_file_path)
+        if not CONFIG_FILE.exists(): return None
+        config = self.get_application().get_config()
         
         new_tags = [tag.strip() for tag in self.tags_entry.get_text().split(',') if tag.strip()]
         
@@ -425,27 +688,65 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
             'obsidian_dir': config.get('Paths', 'ObsidianVaultPicturesDirectory'),
             'resize_w': config.getint('Settings', 'ResizeWidth'),
             'resize_h': config.getint('Settings', 'ResizeHeight'),
+            'raw_full_quality': config.getboolean('Settings', 'RawFullQuality', fallback=False),
+            'rendition_format': config.get('Settings', 'RenditionFormat', fallback='jpeg'),
+            'rendition_preset': config.get('Settings', 'RenditionPreset', fallback='balanced'),
             'base_name': self.rename_entry.get_text(),
             'start_number': int(self.rename_spinner.get_value()),
-            'tags': new_tags
+            'tags': new_tags,
+            'on_collision': config.get('Settings', 'OnCollision', fallback='skip'),
+            'verify': config.get('Settings', 'VerifyTransfers', fallback='all'),
+            'verify_sample_rate': config.getfloat('Settings', 'VerifySampleRate', fallback=0.1),
+            'checksum_algorithm': config.get('Settings', 'ChecksumAlgorithm', fallback='blake2b'),
+            'readahead_files': config.getint('Settings', 'ReadAheadFiles', fallback=4),
+            'staging_dir': config.get('Paths', 'StagingDirectory', fallback=''),
+            'migration_bandwidth': config.getfloat('Settings', 'MigrationBandwidth', fallback=0),
+            'migration_retries': config.getint('Settings', 'MigrationRetries', fallback=5),
         }
+        return selection_data, settings, new_tags, config
+    
+    def on_process_files_clicked(self, widget):
+        batch = self.collect_batch()
+        if not batch: return
+        selection_data, settings, new_tags, config = batch
+        job_server = config.get('Server', 'JobServerUrl', fallback='').strip()
         self.spinner.start()
         self.batch_process_button.set_sensitive(False)
         self.review_button.set_sensitive(False)
-        thread = threading.Thread(target=self.processing_thread_worker_batch, args=(selection_data, settings, new_tags))
+        thread = threading.Thread(target=self.processing_thread_worker_batch, args=(selection_data, settings, new_tags, job_server))
         thread.start()
         
-    def processing_thread_worker_batch(self, selection_data, settings, new_tags):
-        core_engine.process_batch(selection_data, settings)
-        GLib.idle_add(self.on_processing_finished, new_tags)
+    def processing_thread_worker_batch(self, selection_data, settings, new_tags, job_server=None):
+        try:
+            if job_server:
+                # Hand the batch to the job server instead of processing it on this machine.
+                import jobserver
+                try:
+                    job_id = jobserver.submit_job(job_server, selection_data, settings)
+                    print(f"📤 Submitted job {job_id} to {job_server}")
+                    job = jobserver.wait_for_job(job_server, job_id,
+                                                 on_progress=lambda job: GLib.idle_add(self.show_job_progress, job))
+                    print(f"Job {job_id} finished: {job['status'] if job else 'unknown'}")
+                except Exception as e:
+                    print(f"❗️ Job server error: {e}")
+            else:
+                import photoflow as core_engine
+                core_engine.process_batch(selection_data, settings)
+        except Exception as e:
+            print(f"❗️ Processing stopped: {e}")
+        finally:
+            GLib.idle_add(self.on_processing_finished, new_tags)
+    
+    def show_job_progress(self, job):
+        total = job['total'] or 1
+        self.job_progress.set_fraction(job['done'] / total)
+        self.job_progress.set_text(f"Job {job['id']}: {job['status']} {job['done']}/{job['total']}")
+        self.job_progress.set_visible(True)
 
     def start_individual_processing(self, review_data, all_specific_tags):
         print("Starting individual processing...")
-        config = configparser.ConfigParser()
-        script_dir = Path(__file__).parent.resolve()
-        config_file_path = script_dir / 'config.ini'
-        if not config_file_path.exists(): return
-        config.read(config_file_path)
+        if not CONFIG_FILE.exists(): return
+        config = self.get_application().get_config()
         
         common_tags = [tag.strip() for tag in self.tags_entry.get_text().split(',') if tag.strip()]
         
@@ -454,7 +755,17 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
             'obsidian_dir': config.get('Paths', 'ObsidianVaultPicturesDirectory'),
             'resize_w': config.getint('Settings', 'ResizeWidth'),
             'resize_h': config.getint('Settings', 'ResizeHeight'),
-            'tags': common_tags
+            'raw_full_quality': config.getboolean('Settings', 'RawFullQuality', fallback=False),
+            'rendition_format': config.get('Settings', 'RenditionFormat', fallback='jpeg'),
+            'rendition_preset': config.get('Settings', 'RenditionPreset', fallback='balanced'),
+            'tags': common_tags,
+            'verify': config.get('Settings', 'VerifyTransfers', fallback='all'),
+            'verify_sample_rate': config.getfloat('Settings', 'VerifySampleRate', fallback=0.1),
+            'checksum_algorithm': config.get('Settings', 'ChecksumAlgorithm', fallback='blake2b'),
+            'on_collision': config.get('Settings', 'OnCollision', fallback='skip'),
+            'staging_dir': config.get('Paths', 'StagingDirectory', fallback=''),
+            'migration_bandwidth': config.getfloat('Settings', 'MigrationBandwidth', fallback=0),
+            'migration_retries': config.getint('Settings', 'MigrationRetries', fallback=5),
         }
         
         all_new_tags = list(set(common_tags + all_specific_tags))
@@ -466,13 +777,154 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
         thread.start()
 
     def processing_thread_worker_individual(self, review_data, settings, all_new_tags):
-        core_engine.process_photos_individual(review_data, settings)
-        GLib.idle_add(self.on_processing_finished, all_new_tags)
+        import photoflow as core_engine
+        try:
+            core_engine.process_photos_individual(review_data, settings)
+        except Exception as e:
+            print(f"❗️ Processing stopped: {e}")
+        finally:
+            GLib.idle_add(self.on_processing_finished, all_new_tags)
+    
+    def on_preview_plan_clicked(self, widget):
+        batch = self.collect_batch()
+        if not batch: return
+        selection_data, settings, new_tags, config = batch
+        self.spinner.start()
+        # Planning reads every file's capture date, so keep it off the main loop.
+        thread = threading.Thread(target=self.planning_thread_worker, args=(selection_data, settings, new_tags))
+        thread.start()
+    
+    def planning_thread_worker(self, selection_data, settings, new_tags):
+        import photoflow as core_engine
+        plan = core_engine.plan_batch(selection_data, settings)
+        GLib.idle_add(self.show_plan, plan, new_tags)
+    
+    def show_plan(self, plan, new_tags):
+        self.spinner.stop()
+        PlanWindow(self, plan, new_tags).present()
+    
+    def start_plan_execution(self, plan, new_tags):
+        self.spinner.start()
+        self.batch_process_button.set_sensitive(False)
+        self.review_button.set_sensitive(False)
+        thread = threading.Thread(target=self.processing_thread_worker_plan, args=(plan, new_tags))
+        thread.start()
+    
+    def processing_thread_worker_plan(self, plan, new_tags):
+        import photoflow as core_engine
+        try:
+            core_engine.execute_plan(plan)
+        except Exception as e:
+            print(f"❗️ Processing stopped: {e}")
+        finally:
+            GLib.idle_add(self.on_processing_finished, new_tags)
+    
+    def on_add_to_queue_clicked(self, widget):
+        batch = self.collect_batch()
+        if not batch: return
+        selection_data, settings, new_tags, config = batch
+        name = Path(self.last_source_folder_path).name if self.last_source_folder_path else "Selection"
+        row = len(self.ingest_queue) + 1
+        entry = {'name': name, 'selection_data': selection_data, 'settings': settings, 'new_tags': new_tags,
+                 'progress': Gtk.ProgressBar(hexpand=True, show_text=True), 'rate': Gtk.Label(label="—")}
+        self.queue_grid.attach(Gtk.Label(label=name, halign=Gtk.Align.START), 0, row, 1, 1)
+        self.queue_grid.attach(Gtk.Label(label=str(len(selection_data))), 1, row, 1, 1)
+        entry['device'] = Gtk.Label(label="…", halign=Gtk.Align.START)
+        self.queue_grid.attach(entry['device'], 2, row, 1, 1)
+        self.queue_grid.attach(entry['progress'], 3, row, 1, 1)
+        self.queue_grid.attach(entry['rate'], 4, row, 1, 1)
+        self.ingest_queue.append(entry)
+        # Lock the queued photos so they can't be queued (or processed) a second time.
+        for item in selection_data:
+            self.queued_paths.update(path for path in (item['jpg_path'], item['raw_path']) if path)
+        for child in self.thumbnail_view.get_selected_children():
+            child.set_sensitive(False)
+        # Continue the numbering so the next card doesn't reuse these names.
+        self.rename_spinner.set_value(settings['start_number'] + len(selection_data))
+        self.thumbnail_view.unselect_all()
+        self.queue_run_button.set_sensitive(True)
+    
+    def on_ingest_all_clicked(self, widget):
+        import scheduler
+        if not self.ingest_queue: return
+        config = self.get_application().get_config()
+        ingest = scheduler.IngestScheduler(
+            config.getint('Settings', 'MaxReadersPerDevice', fallback=scheduler.DEFAULT_MAX_READERS_PER_DEVICE),
+            on_update=lambda sched: GLib.idle_add(self.update_queue_grid, sched),
+            max_writers_per_device=config.getint('Settings', 'MaxWritersPerDevice',
+                                                 fallback=scheduler.DEFAULT_MAX_WRITERS_PER_DEVICE))
+        # Devices are worked out on the worker threads; they show up in the grid once known.
+        for entry in self.ingest_queue:
+            entry['job'] = ingest.add(entry['name'], entry['selection_data'], entry['settings'])
+        all_tags = [tag for entry in self.ingest_queue for tag in entry['new_tags']]
+        self.spinner.start()
+        self.batch_process_button.set_sensitive(False)
+        self.review_button.set_sensitive(False)
+        self.queue_add_button.set_sensitive(False)
+        self.queue_run_button.set_sensitive(False)
+        thread = threading.Thread(target=self.processing_thread_worker_queue, args=(ingest, all_tags))
+        thread.start()
+    
+    def processing_thread_worker_queue(self, ingest, all_tags):
+        ingest.run()
+        GLib.idle_add(self.update_queue_grid, ingest)
+        GLib.idle_add(self.on_queue_finished, all_tags)
+    
+    def update_queue_grid(self, ingest):
+        for entry in self.ingest_queue:
+            job = entry.get('job')
+            if not job: continue
+            entry['progress'].set_fraction(job.done / job.total if job.total else 1.0)
+            entry['progress'].set_text(f"{job.status} {job.done}/{job.total}")
+            entry['rate'].set_text(f"{job.rate() / 1e6:.1f} MB/s")
+            if job.status != 'queued':
+                entry['device'].set_text(f"{job.read_device or '?'} → {job.write_device or '?'}")
+        done = sum(job.done for job in ingest.jobs)
+        total = sum(job.total for job in ingest.jobs)
+        self.queue_total_label.set_text(f"Combined: {done}/{total} files, {ingest.throughput() / 1e6:.1f} MB/s")
+    
+    def on_queue_finished(self, all_tags):
+        for entry in self.ingest_queue:
+            self.queue_grid.remove_row(1) # Row 0 is the header.
+        self.ingest_queue = []
+        self.queued_paths = set()
+        self.queue_add_button.set_sensitive(True)
+        self.on_processing_finished(all_tags)
+    
+    def start_migration_status(self):
+        """Shows the background archive migration's progress until the queue is empty."""
+        if not self.migration_status_active:
+            self.migration_status_active = True
+            GLib.timeout_add_seconds(2, self.update_migration_status)
+        self.update_migration_status()
+    
+    def update_migration_status(self):
+        import migrator
+        running = migrator.background()
+        # The running migrator refreshes its counts on its own thread; don't query SQLite on the main loop.
+        queue = running.queue if running and running.queue else migrator.counts()
+        files = sum(queue.get(status, (0, 0))[0] for status in ('pending', 'running'))
+        size = sum(queue.get(status, (0, 0))[1] for status in ('pending', 'running'))
+        failed = queue.get('failed', (0, 0))[0]
+        if files and running and running.offline:
+            self.migration_label.set_text(f"⏸️  Archive not available: {files} files ({size / 1e6:.0f} MB) waiting to migrate")
+        elif files:
+            rate = f" at {running.rate() / 1e6:.1f} MB/s" if running and running.bytes_moved else ""
+            self.migration_label.set_text(f"📦 Migrating to archive: {files} files ({size / 1e6:.0f} MB) left{rate}")
+        elif failed:
+            self.migration_label.set_text(f"❗️ {failed} files could not be migrated to the archive. "
+                                          "Run 'python3 migrator.py retry' once it is available.")
+        self.migration_label.set_visible(bool(files or failed))
+        self.migration_status_active = bool(files)
+        return self.migration_status_active
     
     def on_processing_finished(self, new_tags):
         self.spinner.stop()
+        self.job_progress.set_visible(False)
         self.batch_process_button.set_sensitive(True)
         self.review_button.set_sensitive(True)
+        if self.get_application().get_config().get('Paths', 'StagingDirectory', fallback='').strip():
+            self.start_migration_status()
         
         app = self.get_application()
         app.save_tags(new_tags)
@@ -523,19 +975,87 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
             thread.start()
         dialog.destroy()
             
+    def sort_thumbnails(self, child_a, child_b, *args):
+        # load_index lives on the FlowBoxChild itself, so a comparison makes no GI calls.
+        if self.sort_ranks is None: return 0
+        return self.sort_ranks[child_a.load_index] - self.sort_ranks[child_b.load_index]
+    
+    def filter_thumbnail(self, child):
+        if self.visible_rows is None: return True
+        return self.visible_rows[child.load_index]
+    
+    def refresh_grid_order(self):
+        """Re-sorts the grid from the photo index; no widget is rebuilt."""
+        if self.photo_index is None: return
+        label, key, descending = SORT_OPTIONS[self.sort_dropdown.get_selected()]
+        # Plain lists: the sort func is called O(n log n) times and list indexing is cheapest.
+        sort_ranks = self.photo_index.ranks(key, descending).tolist()
+        # New photos were inserted in place already; a full re-sort is only needed if the order changed.
+        if sort_ranks == self.sort_ranks: return
+        self.sort_ranks = sort_ranks
+        self.thumbnail_view.invalidate_sort()
+    
+    def refresh_grid_filter(self):
+        if self.photo_index is None: return
+        label, kind = FILTER_OPTIONS[self.filter_dropdown.get_selected()]
+        visible_rows = self.photo_index.visible(kind, self.gps_filter_button.get_active()).tolist()
+        if visible_rows == self.visible_rows: return
+        self.visible_rows = visible_rows
+        # Hidden photos must not stay selected, or they would be processed unseen.
+        for child in self.thumbnail_view.get_selected_children():
+            if not self.visible_rows[child.get_child().load_index]:
+                self.thumbnail_view.unselect_child(child)
+        self.thumbnail_view.invalidate_filter()
+    
+    def schedule_grid_refresh(self):
+        """Coalesces the many per-photo index updates of a folder load into one re-sort."""
+        if self.index_refresh_pending: return
+        self.index_refresh_pending = True
+        GLib.timeout_add(200, self.refresh_grid)
+    
+    def refresh_grid(self):
+        self.index_refresh_pending = False
+        self.refresh_grid_order()
+        self.refresh_grid_filter()
+        return False
+    
+    def on_select_best_clicked(self, widget):
+        import scoring
+        scores_by_key = {name: w.scores for name, w in self.thumbnails_by_name.items() if w.scores}
+        grouped = {name for group in self.burst_groups for name in group}
+        groups = self.burst_groups + [[name] for name in self.thumbnails_by_name if name not in grouped]
+        keep = scoring.best_per_group(groups, scores_by_key, int(self.best_count_spinner.get_value()))
+        # Open any collapsed burst that has more than its top frame kept.
+        for best, others in self.group_widgets:
+            if any(w.base_name in keep for w in others):
+                self.set_group_expanded(best, others, True)
+        self.thumbnail_view.unselect_all()
+        for name in keep:
+            if name in self.thumbnails_by_name:
+                self.thumbnail_view.select_child(self.thumbnails_by_name[name].get_parent())
+    
     def on_deselect_all_clicked(self, widget):
         self.thumbnail_view.unselect_all()
         print("Selection cleared.")
             
-    def add_thumbnail_to_view(self, pixbuf, filename, badge_text, jpg_path, raw_path):
-        thumbnail = ThumbnailWidget(pixbuf, filename, badge_text, jpg_path, raw_path)
+    def add_thumbnail_to_view(self, pixbuf, base_name, badge_text, jpg_path, raw_path):
+        thumbnail = ThumbnailWidget(pixbuf, base_name, badge_text, jpg_path, raw_path)
         thumbnail.set_display_size(int(self.size_slider.get_value()))
+        thumbnail.load_index = self.photo_index.add(base_name, jpg_path, raw_path)
+        # Until the next refresh, new photos go last and are shown.
+        if self.sort_ranks is not None: self.sort_ranks.append(len(self.sort_ranks))
+        if self.visible_rows is not None: self.visible_rows.append(True)
+        self.schedule_grid_refresh()
         
         click_gesture = Gtk.GestureClick.new()
         click_gesture.connect("released", self.on_thumbnail_pressed)
         thumbnail.add_controller(click_gesture)
         
-        self.thumbnail_view.insert(thumbnail, -1)
+        child = ThumbnailChild(thumbnail)
+        # Reloading a card that is still waiting in the queue keeps its queued photos locked.
+        if self.is_queued(thumbnail): child.set_sensitive(False)
+        self.thumbnail_view.insert(child, -1)
+        self.thumbnails_by_name[base_name] = thumbnail
     
     def on_thumbnail_pressed(self, gesture, n_press, x, y):
         modifiers = gesture.get_current_event_state()
@@ -552,8 +1072,21 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
     def clear_thumbnails(self):
         while child := self.thumbnail_view.get_child_at_index(0):
             self.thumbnail_view.remove(child)
+        self.thumbnails_by_name = {}
+        self.burst_groups = []
+        self.group_widgets = []
+        import photoindex
+        self.photo_index = photoindex.PhotoIndex()
+        self.sort_ranks = None
+        self.visible_rows = None
                 
     def load_thumbnails(self, folder_path):
+        # Loaded here, off the main thread, so clear_thumbnails doesn't pay for NumPy.
+        importlib.import_module('photoindex')
+        import rawdev
+        import readorder
+        import scoring
+        import thumbcache
         GLib.idle_add(self.clear_thumbnails) # Clear first
         image_groups = {}
         for entry in os.scandir(folder_path):
@@ -565,20 +1098,123 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
                     if base_name not in image_groups: image_groups[base_name] = {'jpg_path': None, 'raw_path': None}
                     if ext in RAW_EXTENSIONS: image_groups[base_name]['raw_path'] = str(path)
                     else: image_groups[base_name]['jpg_path'] = str(path)
+        to_load = []
         for base_name, paths in image_groups.items():
             path_to_load, badge_text, jpg_path, raw_path = None, None, paths['jpg_path'], paths['raw_path']
             if jpg_path and raw_path: path_to_load, badge_text = jpg_path, "RAW+JPG"
             elif raw_path: path_to_load, badge_text = raw_path, "RAW"
             elif jpg_path: path_to_load = jpg_path
-                
-            if path_to_load:
-                try:
-                    pixbuf = self.create_pixbuf_from_file(path_to_load)
-                    if pixbuf: GLib.idle_add(self.add_thumbnail_to_view, pixbuf, base_name, badge_text, jpg_path, raw_path)
-                except Exception as e:
-                    print(f"Failed to create thumbnail for {base_name}: {e}")
+            if path_to_load: to_load.append((path_to_load, base_name, badge_text, jpg_path, raw_path))
+        # Read the card in on-disk order. Uncached JPEGs are read whole, so read the next few
+        # ahead; RAWs only have their embedded preview read, so prefetching them would waste the card.
+        order = {path: i for i, path in enumerate(readorder.disk_order([entry[0] for entry in to_load]))}
+        to_load.sort(key=lambda entry: order[entry[0]])
+        readahead = readorder.ReadAhead([path for path, base_name, badge_text, jpg_path, raw_path in to_load
+                                         if path != raw_path and not thumbcache.has_thumbnail(path)])
+        pending_raws = []
+        loaded = []
+        for path_to_load, base_name, badge_text, jpg_path, raw_path in to_load:
+            readahead.start(path_to_load)
+            try:
+                pixbuf = self.create_pixbuf_from_file(path_to_load)
+                if pixbuf:
+                    GLib.idle_add(self.add_thumbnail_to_view, pixbuf, base_name, badge_text, jpg_path, raw_path)
+                    loaded.append((base_name, path_to_load))
+                elif raw_path and path_to_load == raw_path:
+                    # No embedded preview: develop it in the worker pool and keep going.
+                    pending_raws.append((rawdev.develop_async(raw_path, half_size=True), base_name, badge_text, jpg_path, raw_path))
+            except Exception as e:
+                print(f"Failed to create thumbnail for {base_name}: {e}")
+        for future, base_name, badge_text, jpg_path, raw_path in pending_raws:
+            try:
+                pixbuf = self.create_pixbuf_from_file(future.result(), cache_as=raw_path)
+                if pixbuf:
+                    GLib.idle_add(self.add_thumbnail_to_view, pixbuf, base_name, badge_text, jpg_path, raw_path)
+                    loaded.append((base_name, raw_path))
+            except Exception as e:
+                print(f"Failed to develop thumbnail for {base_name}: {e}")
+        metas = self.read_photo_info(loaded)
+        GLib.idle_add(self.apply_photo_info, metas)
+        try:
+            GLib.idle_add(self.apply_burst_groups, self.find_bursts(loaded, metas))
+        except Exception as e:
+            print(f"Failed to group bursts: {e}")
+        names_by_path = {path: base_name for base_name, path in loaded}
+        
+        def on_scored(path, scores):
+            # Scoring is the last read of each file, so it can leave the page cache now.
+            readahead.finish(path)
+            GLib.idle_add(self.set_thumbnail_scores, names_by_path[path], scores)
+        scoring.score_files(list(names_by_path), on_result=on_scored)
+        GLib.idle_add(self.schedule_grid_refresh)
+    
+    def set_thumbnail_scores(self, base_name, scores):
+        if base_name in self.thumbnails_by_name:
+            thumbnail = self.thumbnails_by_name[base_name]
+            thumbnail.set_scores(scores)
+            # No re-sort per score: load_thumbnails re-sorts once when scoring is done.
+            self.photo_index.set_scores(thumbnail.load_index, scores)
+    
+    def read_photo_info(self, loaded):
+        """Returns the cached metadata of each loaded photo, reading whatever is missing with one exiftool call."""
+        import photoflow as core_engine
+        import thumbcache
+        metas = {base_name: thumbcache.get_meta(path) for base_name, path in loaded}
+        unread = [path for base_name, path in loaded if 'has_gps' not in metas[base_name]]
+        if unread:
+            info = core_engine.get_photo_info(unread)
+            for base_name, path in loaded:
+                if path in info:
+                    metas[base_name].update(info[path])
+                    thumbcache.update_meta(path, **info[path])
+        return metas
+    
+    def apply_photo_info(self, metas):
+        for base_name, meta in metas.items():
+            if base_name in self.thumbnails_by_name:
+                self.photo_index.set_info(self.thumbnails_by_name[base_name].load_index, meta)
+        self.schedule_grid_refresh()
+    
+    def find_bursts(self, loaded, metas):
+        """Groups the loaded thumbnails into bursts using the hashes stored in the thumbnail cache."""
+        import similarity
+        entries = [dict(metas[base_name], key=base_name) for base_name, path in loaded if 'phash' in metas[base_name]]
+        return similarity.group_bursts(entries)
+    
+    def apply_burst_groups(self, groups):
+        """Collapses every burst in the grid to its best frame."""
+        self.burst_groups = groups
+        for group in groups:
+            widgets = [self.thumbnails_by_name[name] for name in group if name in self.thumbnails_by_name]
+            if len(widgets) < 2: continue
+            best, others = widgets[0], widgets[1:]
+            best.group_button.connect('clicked', self.on_group_button_clicked, best, others)
+            self.group_widgets.append((best, others))
+            self.set_group_expanded(best, others, False)
+    
+    def set_group_expanded(self, best, others, expanded):
+        for widget in others:
+            flowbox_child = widget.get_parent()
+            if not expanded and flowbox_child.is_selected():
+                self.thumbnail_view.unselect_child(flowbox_child)
+            flowbox_child.set_visible(expanded)
+        best.set_group_state(len(others), expanded)
+    
+    def on_group_button_clicked(self, button, best, others):
+        expanded = others[0].get_parent().get_visible()
+        self.set_group_expanded(best, others, not expanded)
                         
-    def create_pixbuf_from_file(self, file_path, initial_size=256):
+    def create_pixbuf_from_file(self, file_path, initial_size=256, cache_as=None):
+        import subprocess
+        from PIL import Image, ImageOps
+        import readorder
+        import similarity
+        import thumbcache
+        # cache_as lets a developed RAW be cached under the RAW's own identity.
+        cache_key_path = cache_as or file_path
+        png_data, meta = thumbcache.get(cache_key_path)
+        if png_data and 'phash' in meta:
+            return self.pixbuf_from_png(png_data)
         path = Path(file_path)
         img_data = None
         if path.suffix.lower() in RAW_EXTENSIONS:
@@ -592,7 +1228,7 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
                     img_data = result.stdout
             except Exception: return None
         else:
-            with open(file_path, 'rb') as f: img_data = f.read()
+            with readorder.open_sequential(file_path) as f: img_data = f.read()
         if img_data:
             img = Image.open(io.BytesIO(img_data))
             img = ImageOps.exif_transpose(img)
@@ -600,18 +1236,28 @@ class PhotoFlowWindow(Gtk.ApplicationWindow):
             byte_stream = io.BytesIO()
             img.save(byte_stream, format='PNG')
             final_data = byte_stream.getvalue()
-            loader = GdkPixbuf.PixbufLoader.new_with_type('png')
-            loader.write(final_data)
-            loader.close()
-            return loader.get_pixbuf()
+            thumbcache.put_thumbnail(cache_key_path, final_data)
+            thumbcache.update_meta(cache_key_path, dhash=similarity.dhash(img), phash=similarity.phash(img),
+                                   focus=similarity.focus_measure(img))
+            return self.pixbuf_from_png(final_data)
         return None
     
+    def pixbuf_from_png(self, png_data):
+        loader = GdkPixbuf.PixbufLoader.new_with_type('png')
+        loader.write(png_data)
+        loader.close()
+        return loader.get_pixbuf()
+    
 class PhotoFlowApp(Gtk.Application):
-    def __init__(self, **kwargs):
+    def __init__(self, profile_startup=False, **kwargs):
         super().__init__(**kwargs)
+        self.profile_startup = profile_startup
         self.tag_model = None
         self.all_tags = set()
+        self.config = None
+        self.config_thread = None
         self.connect('activate', self.on_activate)
+        self.connect('shutdown', self.on_shutdown)
         
         # Connect the 'app.preferences' action
         action_prefs = Gio.SimpleAction.new("preferences", None)
@@ -625,8 +1271,8 @@ class PhotoFlowApp(Gtk.Application):
         
     def on_preferences_activated(self, action, param):
         """Called when the 'Preferences' menu item is clicked."""
-        win = self.get_active_window()
-        prefs_dialog = PreferencesWindow(win)
+        # Always the main window: Preferences reads its loaded photos and updates its app's config.
+        prefs_dialog = PreferencesWindow(self.win)
         prefs_dialog.present()
         
     def on_about_activated(self, action, param):
@@ -644,9 +1290,73 @@ class PhotoFlowApp(Gtk.Application):
 
     def on_activate(self, app):
         self.load_css()
-        self.load_tag_completion()
+        # An empty model is enough to build the window; the history is filled in once it has been read.
+        self.tag_model = Gtk.ListStore(str)
         self.win = PhotoFlowWindow(application=app)
         self.win.present()
+        self.load_tag_completion()
+        self.load_config_async()
+        frame_clock = self.win.get_frame_clock()
+        if frame_clock:
+            self.first_frame_handler = frame_clock.connect('after-paint', self.on_first_frame)
+        else:
+            GLib.idle_add(self.warm_up_modules)
+    
+    def on_first_frame(self, frame_clock):
+        frame_clock.disconnect(self.first_frame_handler)
+        if self.profile_startup:
+            now = time.perf_counter()
+            heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+            print("⏱️  Startup profile (measured from the first line of gui.py):")
+            print(f"   Module imports:      {(IMPORTS_DONE - STARTUP_T0) * 1000:7.1f} ms")
+            print(f"   Time to first frame: {(now - STARTUP_T0) * 1000:7.1f} ms")
+            print(f"   Heavy modules loaded before first frame: {', '.join(heavy) or 'none'}")
+        self.warm_up_modules()
+    
+    def warm_up_modules(self):
+        """Imports the engine in the background so the first thumbnail load doesn't pay for it."""
+        def worker():
+            for name in ('photoflow', 'rawdev', 'scoring', 'similarity', 'thumbcache'):
+                importlib.import_module(name)
+            self.resume_migration()
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def resume_migration(self):
+        """Picks up archive migrations left queued by an earlier session."""
+        import migrator
+        config = self.get_config()
+        if not config.get('Paths', 'StagingDirectory', fallback='').strip(): return
+        queue = migrator.counts()
+        if not (queue.get('pending') or queue.get('running') or queue.get('failed')): return
+        if queue.get('pending') or queue.get('running'):
+            migrator.start_background({
+                'migration_bandwidth': config.getfloat('Settings', 'MigrationBandwidth', fallback=0),
+                'migration_retries': config.getint('Settings', 'MigrationRetries', fallback=5),
+            })
+        GLib.idle_add(self.win.start_migration_status)
+    
+    def on_shutdown(self, app):
+        # Only stop the worker pool if something actually started it.
+        if 'rawdev' in sys.modules:
+            sys.modules['rawdev'].shutdown()
+    
+    def load_config_async(self):
+        self.config_thread = threading.Thread(target=self.load_config, daemon=True)
+        self.config_thread.start()
+    
+    def load_config(self):
+        import configparser
+        config = configparser.ConfigParser()
+        config.read(CONFIG_FILE)
+        self.config = config
+    
+    def get_config(self):
+        """Returns the parsed config.ini, waiting for the background load if it is still running."""
+        if self.config_thread:
+            self.config_thread.join()
+        if self.config is None:
+            self.load_config()
+        return self.config
 
     def load_css(self):
         """Loads the application's CSS file for styling."""
@@ -659,16 +1369,26 @@ class PhotoFlowApp(Gtk.Application):
                 Gdk.Display.get_default(), provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
         
     def load_tag_completion(self):
-        TAG_CONFIG_DIR.mkdir(parents=True, exist_ok=True)
-        if not TAG_FILE.exists():
-            TAG_FILE.touch()
-        
-        with open(TAG_FILE, 'r') as f:
-            self.all_tags = set(line.strip() for line in f if line.strip())
+        """Reads the tag history on a background thread, then fills the completion model."""
+        def worker():
+            TAG_CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+            if not TAG_FILE.exists():
+                TAG_FILE.touch()
             
-        self.tag_model = Gtk.ListStore(str)
-        for tag in sorted(list(self.all_tags)):
-            self.tag_model.append([tag])
+            with open(TAG_FILE, 'r') as f:
+                tags = sorted(set(line.strip() for line in f if line.strip()))
+            GLib.idle_add(self.add_tags_to_model, tags)
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def add_tags_to_model(self, tags, chunk_size=500):
+        # Filled in chunks so a long tag history never stalls the main loop.
+        for tag in tags[:chunk_size]:
+            if tag not in self.all_tags:
+                self.all_tags.add(tag)
+                self.tag_model.append([tag])
+        if len(tags) > chunk_size:
+            GLib.idle_add(self.add_tags_to_model, tags[chunk_size:])
+        return False
             
     def save_tags(self, new_tags_list):
         new_tags_found = False
@@ -683,7 +1403,8 @@ class PhotoFlowApp(Gtk.Application):
 
 if __name__ == '__main__':
     # This is the entry point of the application
-    import sys
-    app = PhotoFlowApp(application_id="com.crispi.photoflow")
-    exit_status = app.run(sys.argv)
+    profile_startup = '--profile-startup' in sys.argv
+    argv = [arg for arg in sys.argv if arg != '--profile-startup']
+    app = PhotoFlowApp(profile_startup=profile_startup, application_id="com.crispi.photoflow")
+    exit_status = app.run(argv)
     sys.exit(exit_status)
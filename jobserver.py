@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""PhotoFlow ingest job server.
+
+Runs photoflow.process_batch for remote clients, typically on the NAS that
+holds the archive, so a laptop only has to submit the job. Jobs live in a
+SQLite queue that survives restarts and are executed by a pool of worker
+processes. The API is plain HTTP/JSON, served over TCP and/or a Unix socket:
+
+    POST /jobs                 {"selection": [...], "settings": {...}} -> {"id": 1}
+    GET  /jobs                 list of jobs
+    GET  /jobs/<id>            status, progress and results of one job
+    GET  /jobs/<id>/events     server-sent events with progress until the job ends
+
+Selection paths and the settings' dest_dir/obsidian_dir are resolved on the
+server, so they must point at storage the server can see.
+
+There is no authentication, and a job moves and deletes the files it names,
+so by default the server only listens on 127.0.0.1. With --socket it listens
+only on the Unix socket, unless --host or --port is given as well.
+
+Usage: python3 jobserver.py [--host 127.0.0.1] [--port 8765] [--socket PATH] [--workers 2] [--db PATH]
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+DEFAULT_DB = Path.home() / ".local" / "share" / "PhotoFlow" / "jobs.db"
+DEFAULT_PORT = 8765
+FINISHED_STATES = ('done', 'failed', 'interrupted')
+POLL_INTERVAL = 0.5
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_db(db_path):
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    with _connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            status TEXT NOT NULL,
+            selection TEXT NOT NULL,
+            settings TEXT NOT NULL,
+            done INTEGER DEFAULT 0,
+            total INTEGER DEFAULT 0,
+            current TEXT,
+            results TEXT,
+            error TEXT,
+            created REAL,
+            started REAL,
+            finished REAL)""")
+
+
+def _job_to_dict(row):
+    return {
+        'id': row['id'], 'status': row['status'],
+        'done': row['done'], 'total': row['total'], 'current': row['current'],
+        'results': json.loads(row['results']) if row['results'] else None,
+        'error': row['error'], 'created': row['created'],
+        'started': row['started'], 'finished': row['finished'],
+    }
+
+
+def _run_job(db_path, job_id):
+    """Worker entry point. Runs one job in a child process and records its progress."""
+    import photoflow
+
+    with _connect(db_path) as conn:
+        row = conn.execute("SELECT selection, settings FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    selection, settings = json.loads(row['selection']), json.loads(row['settings'])
+
+    def progress(done, total, current):
+        with _connect(db_path) as conn:
+            conn.execute("UPDATE jobs SET done = ?, total = ?, current = ? WHERE id = ?",
+                         (done, total, current, job_id))
+
+    results = photoflow.process_batch(selection, settings, progress=progress)
+    with _connect(db_path) as conn:
+        conn.execute("UPDATE jobs SET status = 'done', results = ?, current = NULL, finished = ? WHERE id = ?",
+                     (json.dumps(results), time.time(), job_id))
+
+
+class JobQueue:
+    """The persistent queue plus the worker pool that drains it."""
+
+    def __init__(self, db_path=DEFAULT_DB, workers=2):
+        self.db_path = str(db_path)
+        self.workers = workers
+        self.running = {}
+        self.wakeup = threading.Event()
+        self.stopping = False
+        init_db(self.db_path)
+        with _connect(self.db_path) as conn:
+            # A job that was running when the server died may have moved some files already;
+            # re-running it blindly is unsafe, so flag it for the user instead.
+            conn.execute("UPDATE jobs SET status = 'interrupted', finished = ? WHERE status = 'running'", (time.time(),))
+        self.executor = self._new_executor()
+        self.dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def start(self):
+        self.dispatcher.start()
+
+    def stop(self):
+        self.stopping = True
+        self.wakeup.set()
+        if self.dispatcher.is_alive():
+            self.dispatcher.join()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, selection, settings):
+        with _connect(self.db_path) as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (status, selection, settings, total, created) VALUES ('queued', ?, ?, ?, ?)",
+                (json.dumps(selection), json.dumps(settings), len(selection), time.time()))
+            job_id = cursor.lastrowid
+        self.wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        with _connect(self.db_path) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_to_dict(row) if row else None
+
+    def all_jobs(self):
+        with _connect(self.db_path) as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC").fetchall()
+        return [_job_to_dict(row) for row in rows]
+
+    def _dispatch_loop(self):
+        while not self.stopping:
+            self.wakeup.wait(POLL_INTERVAL)
+            self.wakeup.clear()
+            if self.stopping:
+                break
+            free_slots = self.workers - len(self.running)
+            if free_slots <= 0:
+                continue
+            with _connect(self.db_path) as conn:
+                rows = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT ?",
+                                    (free_slots,)).fetchall()
+                for row in rows:
+                    conn.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?", (time.time(), row['id']))
+            for row in rows:
+                try:
+                    future = self._submit(row['id'])
+                except Exception as e:
+                    print(f"❗️ Job {row['id']} could not be started: {e}")
+                    with _connect(self.db_path) as conn:
+                        conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                                     (str(e), time.time(), row['id']))
+                    continue
+                self.running[row['id']] = future
+                future.add_done_callback(lambda f, job_id=row['id']: self._job_finished(job_id, f))
+
+    def _submit(self, job_id):
+        try:
+            return self.executor.submit(_run_job, self.db_path, job_id)
+        except BrokenProcessPool:
+            # A worker died (a crash in LibRaw, the OOM killer...), which breaks the whole pool;
+            # the jobs it was running fail on their own, so start a fresh pool for the rest.
+            print("❗️ A worker process died; restarting the worker pool.")
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._new_executor()
+            return self.executor.submit(_run_job, self.db_path, job_id)
+
+    def _job_finished(self, job_id, future):
+        self.running.pop(job_id, None)
+        error = future.exception() if not future.cancelled() else None
+        if error is not None:
+            print(f"❗️ Job {job_id} failed: {error}")
+            with _connect(self.db_path) as conn:
+                conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                             (str(error), time.time(), job_id))
+        else:
+            print(f"🎉 Job {job_id} complete.")
+        self.wakeup.set()
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    # self.server.queue is set by JobServer.
+
+    def address_string(self):
+        # Unix socket peers have no host/port.
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job_id(self):
+        parts = self.path.strip('/').split('/')
+        try:
+            return int(parts[1])
+        except (IndexError, ValueError):
+            return None
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            return self._send_json(404, {'error': 'not found'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            selection, settings = payload['selection'], payload['settings']
+        except (ValueError, KeyError) as e:
+            return self._send_json(400, {'error': f"bad request: {e}"})
+        job_id = self.server.queue.submit(selection, settings)
+        self._send_json(201, {'id': job_id})
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == '/jobs':
+            return self._send_json(200, self.server.queue.all_jobs())
+        job_id = self._job_id()
+        job = self.server.queue.get(job_id) if job_id is not None else None
+        if job is None:
+            return self._send_json(404, {'error': 'no such job'})
+        if path.endswith('/events'):
+            return self._stream_events(job_id)
+        self._send_json(200, job)
+
+    def _stream_events(self, job_id):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        last = None
+        while True:
+            job = self.server.queue.get(job_id)
+            snapshot = (job['status'], job['done'], job['current'])
+            if snapshot != last:
+                last = snapshot
+                try:
+                    self.wfile.write(f"data: {json.dumps(job)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    return  # The client went away; the job keeps running.
+            if job['status'] in FINISHED_STATES:
+                return
+            time.sleep(POLL_INTERVAL)
+
+    def log_message(self, format, *args):
+        print(f"🌐 {self.address_string()} {format % args}")
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class JobServer:
+    """The queue plus its HTTP front-ends. Pass port=0 to bind a free port (handy for tests)."""
+
+    def __init__(self, db_path=DEFAULT_DB, workers=2, host='127.0.0.1', port=DEFAULT_PORT, socket_path=None):
+        self.queue = JobQueue(db_path, workers)
+        self.servers = []
+        self.started = False
+        if port is not None:
+            self.servers.append(ThreadingHTTPServer((host, port), JobRequestHandler))
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self.servers.append(UnixHTTPServer(socket_path, JobRequestHandler))
+        for server in self.servers:
+            server.queue = self.queue
+
+    @property
+    def url(self):
+        """Base URL of the TCP listener, e.g. http://127.0.0.1:8765."""
+        for server in self.servers:
+            if isinstance(server, ThreadingHTTPServer):
+                host, port = server.server_address[:2]
+                return f"http://{host}:{port}"
+        return None
+
+    def start(self):
+        """Starts serving on background threads."""
+        self.queue.start()
+        for server in self.servers:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.started = True
+
+    def stop(self):
+        for server in self.servers:
+            # shutdown() waits for serve_forever() to return, so it would block if that never ran.
+            if self.started: server.shutdown()
+            server.server_close()
+        self.queue.stop()
+
+
+# --- Client side -------------------------------------------------------------
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def _open_connection(server, timeout=30):
+    """server is 'http://host:port' or 'unix:/path/to/socket'."""
+    if server.startswith('unix:'):
+        return _UnixHTTPConnection(server[len('unix:'):], timeout=timeout)
+    host = server.split('://', 1)[-1].rstrip('/')
+    return http.client.HTTPConnection(host, timeout=timeout)
+
+
+def _request(server, method, path, payload=None):
+    conn = _open_connection(server)
+    try:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        conn.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        data = json.loads(response.read() or b'null')
+        if response.status >= 400:
+            raise RuntimeError(f"Job server error {response.status}: {data.get('error')}")
+        return data
+    finally:
+        conn.close()
+
+
+def submit_job(server, selection, settings):
+    """Submits a process_batch job and returns its id."""
+    return _request(server, 'POST', '/jobs', {'selection': selection, 'settings': settings})['id']
+
+
+def get_job(server, job_id):
+    return _request(server, 'GET', f'/jobs/{job_id}')
+
+
+def watch_job(server, job_id):
+    """Yields job snapshots from the server's event stream until the job finishes."""
+    conn = _open_connection(server, timeout=None)
+    try:
+        conn.request('GET', f'/jobs/{job_id}/events')
+        response = conn.getresponse()
+        if response.status >= 400:
+            raise RuntimeError(f"Job server error {response.status}")
+        for line in response:
+            line = line.decode('utf-8').strip()
+            if line.startswith('data: '):
+                yield json.loads(line[len('data: '):])
+    finally:
+        conn.close()
+
+
+def wait_for_job(server, job_id, on_progress=None):
+    """Blocks until a job finishes, calling on_progress(job) for every update. Returns the final job."""
+    job = None
+    for job in watch_job(server, job_id):
+        if on_progress: on_progress(job)
+    return job
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PhotoFlow ingest job server")
+    parser.add_argument('--host', help="address to listen on (default 127.0.0.1; anyone who can reach it can move files)")
+    parser.add_argument('--port', type=int, help=f"TCP port (default {DEFAULT_PORT})")
+    parser.add_argument('--socket', dest='socket_path', help="listen on this Unix socket (TCP only if --host/--port is also given)")
+    parser.add_argument('--workers', type=int, default=2, help="number of jobs to run at once")
+    parser.add_argument('--db', default=str(DEFAULT_DB), help="path of the job queue database")
+    args = parser.parse_args()
+
+    tcp = args.host is not None or args.port is not None or not args.socket_path
+    port = (args.port if args.port is not None else DEFAULT_PORT) if tcp else None
+    server = JobServer(args.db, args.workers, args.host or '127.0.0.1', port, args.socket_path)
+    server.start()
+    print(f"🚀 PhotoFlow job server on {server.url or args.socket_path} with {args.workers} workers")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
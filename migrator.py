@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""Background migration from the staging tier to the archive.
+
+With StagingDirectory set, an ingest lands originals and archive renditions
+on a fast local disk (in the same Year/Month/Day layout) and returns. Each
+staged file is queued here and moved on to its place in the archive in the
+background, at most MigrationBandwidth MB/s, and checked against the
+checksum it was staged with.
+
+The queue is a SQLite table that survives restarts. While the archive is
+unmounted or the NAS is offline, files simply wait in the queue. An archive
+counts as offline when its folder is missing or sits on a different device
+than when the file was queued (an empty mount point on the root disk). A file
+whose transfer fails with the archive present is retried with exponential
+backoff, up to MigrationRetries attempts, and then marked failed.
+
+Usage: python3 migrator.py run       migrate everything queued, then exit
+       python3 migrator.py status    show the queue
+       python3 migrator.py retry     queue the failed files again
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+import transfer
+
+DEFAULT_DB = Path.home() / ".local" / "share" / "PhotoFlow" / "migration.db"
+DEFAULT_RETRIES = 5
+RETRY_BASE_DELAY = 30
+MAX_RETRY_DELAY = 3600
+POLL_INTERVAL = 2.0
+OFFLINE_RETRY_DELAY = 30
+
+_background = None
+_initialized = set()
+_background_lock = threading.Lock()
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class ArchiveUnavailable(OSError):
+    """The archive a file migrates to is not mounted."""
+
+
+def init_db(db_path=DEFAULT_DB):
+    # Once per process: counts() is polled every few seconds.
+    if str(db_path) in _initialized:
+        return
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    with _connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            status TEXT NOT NULL,
+            staged TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            archive_root TEXT NOT NULL,
+            archive_dev INTEGER,
+            checksum TEXT,
+            settings TEXT NOT NULL,
+            size INTEGER DEFAULT 0,
+            attempts INTEGER DEFAULT 0,
+            next_attempt REAL DEFAULT 0,
+            owner INTEGER,
+            error TEXT,
+            created REAL,
+            finished REAL)""")
+        if 'archive_dev' not in [column[1] for column in conn.execute("PRAGMA table_info(migrations)")]:
+            conn.execute("ALTER TABLE migrations ADD COLUMN archive_dev INTEGER")
+    _initialized.add(str(db_path))
+
+
+def enqueue(staged, destination, settings, checksum=None, db_path=DEFAULT_DB):
+    """Queues a staged file for migration to destination (inside settings['dest_dir'])."""
+    init_db(db_path)
+    # Only what the transfer itself needs; the rest of the batch settings don't matter here.
+    transfer_settings = {key: settings[key] for key in ('verify', 'verify_sample_rate', 'checksum_algorithm', 'on_collision')
+                         if key in settings}
+    archive_root = settings['dest_dir'].strip(' "')
+    archive_dev = _device(archive_root)
+    with _connect(db_path) as conn:
+        known = conn.execute("SELECT archive_dev FROM migrations WHERE archive_root = ? AND archive_dev IS NOT NULL "
+                             "ORDER BY id DESC LIMIT 1", (archive_root,)).fetchone()
+        if known and known[0] != archive_dev and not os.path.ismount(archive_root):
+            # Queued while the archive's drive is unmounted: keep the device it was last seen on.
+            archive_dev = known[0]
+        conn.execute(
+            "INSERT INTO migrations (status, staged, destination, archive_root, archive_dev, checksum, settings, size, created) "
+            "VALUES ('pending', ?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(staged), str(destination), archive_root, archive_dev, checksum,
+             json.dumps(transfer_settings), os.path.getsize(staged), time.time()))
+
+
+def counts(db_path=DEFAULT_DB):
+    """Returns {status: (files, bytes)} for the queue."""
+    init_db(db_path)
+    with _connect(db_path) as conn:
+        rows = conn.execute("SELECT status, COUNT(*), SUM(size) FROM migrations GROUP BY status").fetchall()
+    return {status: (files, size or 0) for status, files, size in rows}
+
+
+def retry_failed(db_path=DEFAULT_DB):
+    """Queues every failed migration again. Returns how many."""
+    init_db(db_path)
+    with _connect(db_path) as conn:
+        return conn.execute("UPDATE migrations SET status = 'pending', attempts = 0, next_attempt = 0, error = NULL "
+                            "WHERE status = 'failed'").rowcount
+
+
+def _device(path):
+    """st_dev of path, or None if it doesn't exist."""
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+
+def _archive_problem(root, archive_dev):
+    """Why the archive at root can't be written to now, or None if it can."""
+    device = _device(root) if Path(root).is_dir() else None
+    if device is None:
+        return "is not available"
+    if archive_dev is not None and device != archive_dev:
+        # An unmounted drive or share leaves its empty mount point behind on the root disk;
+        # never create the archive's folders there.
+        return "is not mounted"
+    return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Migrator:
+    """Drains the migration queue on a background thread, one file at a time."""
+
+    def __init__(self, db_path=DEFAULT_DB, bandwidth_mbps=0, retries=DEFAULT_RETRIES):
+        self.db_path = str(db_path)
+        self.max_bytes_per_second = bandwidth_mbps * 1e6 if bandwidth_mbps else None
+        self.retries = retries
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.bytes_moved = 0
+        self.started = None
+        self.offline = set()  # archive roots seen unavailable
+        self.queue = {}  # counts() as of the last loop iteration, for status displays
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        init_db(self.db_path)
+        with _connect(self.db_path) as conn:
+            # Files a dead process was migrating go back in the queue; a half-written
+            # copy is only ever a .part file, so starting over is safe.
+            for row in conn.execute("SELECT id, owner FROM migrations WHERE status = 'running'").fetchall():
+                if not row['owner'] or not _pid_alive(row['owner']):
+                    conn.execute("UPDATE migrations SET status = 'pending', owner = NULL WHERE id = ?", (row['id'],))
+
+    def start(self):
+        self.started = time.time()
+        self.thread.start()
+
+    def stop(self):
+        self.stopping = True
+        self.wakeup.set()
+
+    def notify(self):
+        """Wakes the migrator up after new files were queued."""
+        self.wakeup.set()
+
+    def rate(self):
+        """Bytes per second moved since start()."""
+        if not self.started:
+            return 0.0
+        return self.bytes_moved / max(time.time() - self.started, 1e-6)
+
+    def _claim(self):
+        with _connect(self.db_path) as conn:
+            row = conn.execute("SELECT * FROM migrations WHERE status = 'pending' AND next_attempt <= ? "
+                               "ORDER BY id LIMIT 1", (time.time(),)).fetchone()
+            if row is None:
+                return None
+            claimed = conn.execute("UPDATE migrations SET status = 'running', owner = ? WHERE id = ? AND status = 'pending'",
+                                   (os.getpid(), row['id'])).rowcount
+        return row if claimed else self._claim()
+
+    def _migrate(self, row):
+        staged, destination = Path(row['staged']), Path(row['destination'])
+        settings = json.loads(row['settings'])
+        problem = _archive_problem(row['archive_root'], row['archive_dev'])
+        if problem:
+            raise ArchiveUnavailable(f"archive {row['archive_root']} {problem}")
+        if not staged.exists() and destination.exists():
+            return  # Moved before a crash, but not yet marked done.
+        if staged.exists() and destination.exists() and row['checksum'] and \
+                transfer.hash_file(destination, settings.get('checksum_algorithm', transfer.DEFAULT_ALGORITHM)) == row['checksum']:
+            staged.unlink()  # Placed before a crash, but the staged copy wasn't removed yet.
+            return
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        transfer.transfer(staged, destination, settings, expected=row['checksum'],
+                          max_bytes_per_second=self.max_bytes_per_second)
+        self.bytes_moved += row['size']
+        # Tidy up the staging tier's now-empty Day/Month/Year folders.
+        depth = len(destination.relative_to(row['archive_root']).parts) - 1
+        for parent in list(staged.parents)[:depth]:
+            try: parent.rmdir()
+            except OSError: break
+
+    def run_once(self):
+        """Migrates one due file. Returns False if nothing was due."""
+        row = self._claim()
+        if row is None:
+            return False
+        try:
+            self._migrate(row)
+        except ArchiveUnavailable as e:
+            # Not the file's fault: wait for the archive without using up its retries.
+            if row['archive_root'] not in self.offline:
+                self.offline.add(row['archive_root'])
+                print(f"⏸️  {e}; files for it stay queued until it is back.")
+            with _connect(self.db_path) as conn:
+                conn.execute("UPDATE migrations SET status = 'pending', next_attempt = ?, error = ?, owner = NULL "
+                             "WHERE id = ?", (time.time() + OFFLINE_RETRY_DELAY, str(e), row['id']))
+            return True
+        except (transfer.TransferError, OSError) as e:
+            attempts = row['attempts'] + 1
+            status = 'failed' if attempts >= self.retries else 'pending'
+            delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+            print(f"❗️ Migrating {Path(row['staged']).name} failed (attempt {attempts}/{self.retries}): {e}")
+            with _connect(self.db_path) as conn:
+                conn.execute("UPDATE migrations SET status = ?, attempts = ?, next_attempt = ?, error = ?, owner = NULL "
+                             "WHERE id = ?", (status, attempts, time.time() + delay, str(e), row['id']))
+            return True
+        if row['archive_root'] in self.offline:
+            self.offline.discard(row['archive_root'])
+            print(f"▶️  Archive {row['archive_root']} is back; migrating.")
+        with _connect(self.db_path) as conn:
+            conn.execute("UPDATE migrations SET status = 'done', owner = NULL, error = NULL, finished = ? WHERE id = ?",
+                         (time.time(), row['id']))
+        return True
+
+    def _loop(self):
+        while not self.stopping:
+            self.queue = counts(self.db_path)
+            if not self.run_once():
+                self.wakeup.wait(POLL_INTERVAL)
+                self.wakeup.clear()
+
+    def archives_offline(self):
+        """True if every archive with files pending is unavailable."""
+        with _connect(self.db_path) as conn:
+            roots = conn.execute("SELECT DISTINCT archive_root, archive_dev FROM migrations WHERE status = 'pending'").fetchall()
+        return bool(roots) and all(_archive_problem(root, dev) for root, dev in roots)
+
+    def drain(self):
+        """Migrates until nothing is left pending, waiting out retry delays. Returns the final counts.
+
+        Stops early, leaving the files queued, if the archive is unavailable.
+        """
+        self.started = time.time()
+        while counts(self.db_path).get('pending'):
+            if self.archives_offline():
+                print("⏸️  The archive is not available; the remaining files stay queued.")
+                break
+            if not self.run_once():
+                time.sleep(POLL_INTERVAL)
+        return counts(self.db_path)
+
+
+def start_background(settings):
+    """Starts (once per process) a Migrator configured from the batch settings, or wakes it up."""
+    global _background
+    with _background_lock:
+        if _background is None:
+            _background = Migrator(bandwidth_mbps=settings.get('migration_bandwidth', 0),
+                                   retries=settings.get('migration_retries', DEFAULT_RETRIES))
+            _background.start()
+        else:
+            _background.notify()
+    return _background
+
+
+def background():
+    """The running background Migrator, if any."""
+    return _background
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) == 2 else None
+    if command == 'run':
+        import configparser
+        config = configparser.ConfigParser()
+        config.read(Path(__file__).parent.resolve() / 'config.ini')
+        migrator = Migrator(bandwidth_mbps=config.getfloat('Settings', 'MigrationBandwidth', fallback=0),
+                            retries=config.getint('Settings', 'MigrationRetries', fallback=DEFAULT_RETRIES))
+        final = migrator.drain()
+        print(f"✅ Migrated {migrator.bytes_moved / 1e6:.1f} MB at {migrator.rate() / 1e6:.1f} MB/s.")
+        if final.get('failed'):
+            print(f"❗️ {final['failed'][0]} file(s) failed; see 'python3 migrator.py status'.")
+        sys.exit(1 if final.get('failed') or final.get('pending') else 0)
+    elif command == 'status':
+        init_db()
+        with _connect(DEFAULT_DB) as conn:
+            rows = conn.execute("SELECT * FROM migrations WHERE status != 'done' ORDER BY id").fetchall()
+        for row in rows:
+            print(f"{row['status']:<8} {row['staged']} → {row['destination']}" + (f"  ({row['error']})" if row['error'] else ""))
+        for status, (files, size) in sorted(counts().items()):
+            print(f"{status}: {files} files, {size / 1e6:.1f} MB")
+    elif command == 'retry':
+        print(f"Queued {retry_failed()} failed file(s) again.")
+    else:
+        print("Usage: python3 migrator.py run|status|retry")
+        sys.exit(2)
@@ -7,6 +7,15 @@ from PIL import Image, ImageOps
 import shutil
 import io
 import os # Import os for os.remove
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import migrator
+import planner
+import rawdev
+import readorder
+import renditions
+import transfer
 
 RAW_EXTENSIONS = ['.dng']
 
@@ -38,6 +47,80 @@ def get_exif_date(file_path):
         return datetime.fromtimestamp(file_path.stat().st_mtime)
     return datetime.now()
 
+def _read_exif(file_paths, tags):
+    """Reads tags for many files with a single exiftool call. Returns {path: metadata dict}."""
+    if not file_paths:
+        return {}
+    try:
+        # Pass the file list through an argfile on stdin so a whole card never hits ARG_MAX.
+        command = ['exiftool', '-json'] + [f'-{tag}' for tag in tags] + ['-@', '-']
+        result = subprocess.run(command, input="\n".join(str(p) for p in file_paths),
+                                capture_output=True, text=True)
+        return {str(Path(metadata['SourceFile'])): metadata for metadata in json.loads(result.stdout or "[]")}
+    except Exception as e:
+        print(f"❗️ Could not read metadata: {e}")
+        return {}
+
+def _parse_capture_date(metadata):
+    date_str = metadata.get('DateTimeOriginal')
+    if not date_str: return None
+    try:
+        date = datetime.strptime(date_str, '%Y:%m:%d %H:%M:%S')
+    except ValueError: return None
+    sub_sec = str(metadata.get('SubSecTimeOriginal') or '')
+    if sub_sec.isdigit():
+        date = date.replace(microsecond=int(sub_sec.ljust(6, '0')[:6]))
+    return date
+
+def get_exif_dates(file_paths):
+    """Reads capture dates for many files with a single exiftool call. Falls back to mtime."""
+    file_paths = [Path(p) for p in file_paths]
+    dates = {}
+    for path, metadata in _read_exif(file_paths, ['DateTimeOriginal', 'SubSecTimeOriginal']).items():
+        date = _parse_capture_date(metadata)
+        if date: dates[path] = date
+    for p in file_paths:
+        if str(p) not in dates:
+            dates[str(p)] = datetime.fromtimestamp(p.stat().st_mtime)
+    return dates
+
+def get_photo_info(file_paths):
+    """Reads what the grid sorts and filters on for many files with a single exiftool call.
+
+    Returns {path: {'captured', 'has_gps', 'width', 'height', 'camera', 'rating'}},
+    with captured as a timestamp (falling back to mtime).
+    """
+    file_paths = [Path(p) for p in file_paths]
+    exif = _read_exif(file_paths, ['DateTimeOriginal', 'SubSecTimeOriginal', 'GPSLatitude',
+                                   'ImageWidth', 'ImageHeight', 'Model', 'Rating'])
+    info = {}
+    for p in file_paths:
+        metadata = exif.get(str(p), {})
+        date = _parse_capture_date(metadata)
+        info[str(p)] = {
+            'captured': date.timestamp() if date else p.stat().st_mtime,
+            'has_gps': 'GPSLatitude' in metadata,
+            'width': metadata.get('ImageWidth') if isinstance(metadata.get('ImageWidth'), int) else None,
+            'height': metadata.get('ImageHeight') if isinstance(metadata.get('ImageHeight'), int) else None,
+            'camera': str(metadata['Model']).strip() if metadata.get('Model') else None,
+            'rating': metadata.get('Rating') if isinstance(metadata.get('Rating'), (int, float)) else None,
+        }
+    return info
+
+def open_source_image(file_path, full_quality=False):
+    """Opens the image to render from: the embedded preview for RAWs, falling back to a rawpy development."""
+    if file_path.suffix.lower() in RAW_EXTENSIONS:
+        if not full_quality:
+            command = ['exiftool', '-b', '-PreviewImage', str(file_path)]
+            result = subprocess.run(command, capture_output=True)
+            if result.stdout:
+                return Image.open(io.BytesIO(result.stdout))
+        # No usable preview (or full quality requested): develop the RAW itself.
+        developed = rawdev.develop(file_path, half_size=not full_quality)
+        return Image.open(developed) if developed else None
+    with readorder.open_sequential(file_path) as f:
+        return Image.open(io.BytesIO(f.read()))
+
 def safe_move(src_path, dest_path):
     """Safely moves a file, even across different filesystems."""
     try:
@@ -50,112 +133,187 @@ def safe_move(src_path, dest_path):
     except Exception as e:
         print(f"❗️ Error moving file {src_path.name}: {e}")
 
-def process_batch(selection_data, settings):
-    """Processes photos using only the main batch settings."""
-    print("\n--- Starting Batch Processing Workflow ---")
-    
-    base_name = settings['base_name']
-    start_number = settings['start_number']
+def land_file(src, dest, settings, keep_source=False):
+    """Transfers src to its archive destination, or with a staging tier to dest's place there.
+
+    Staged files are queued for the background migrator (see migrator.py).
+    Returns the checksum.
+    """
+    staged = planner.staged_path(dest, settings)
+    if staged == Path(dest):
+        return transfer.transfer(src, dest, settings, keep_source)
+    staged.parent.mkdir(parents=True, exist_ok=True)
+    digest = transfer.transfer(src, staged, settings, keep_source, manifest=False)
+    migrator.enqueue(staged, dest, settings, digest)
+    return digest
+
+def plan_batch(selection_data, settings):
+    """Prefetches capture dates for the whole selection and returns its ingest plan (see planner.py)."""
+    # Read the headers in on-disk order; the plan itself keeps the selection's order.
+    dates = get_exif_dates(readorder.disk_order([item['raw_path'] or item['jpg_path'] for item in selection_data]))
+    return planner.plan_batch(selection_data, settings, dates)
+
+def execute_plan_item(item, settings):
+    """Ingests one planned photo. Items are independent, so a plan can run in any order or in parallel."""
+    path_for_meta = Path(item['source'])
+    print(f"\nProcessing {path_for_meta.name}...")
     tags = settings['tags']
+    if not path_for_meta.exists():
+        print(f"❗️ {path_for_meta.name} is gone; was this plan already executed?")
+        return {'source': item['source'], 'status': 'error', 'error': 'source file not found'}
+    # The plan may be older than the archive: check its destinations again before writing anything.
+    item, conflicts = planner.recheck_item(item, settings)
+    if conflicts:
+        print(f"⚠️  Skipping {path_for_meta.name}: {'; '.join(conflicts)}")
+        return {'source': item['source'], 'status': 'skipped', 'error': '; '.join(conflicts)}
+    resized_path_obsidian = Path(item['rendition'])
     
-    dest_dir = Path(settings['dest_dir'].strip(' "'))
-    obsidian_dir = Path(settings['obsidian_dir'].strip(' "'))
-    
-    for i, item in enumerate(selection_data):
-        current_number = start_number + i
-        path_for_meta = Path(item['raw_path'] or item['jpg_path'])
-        print(f"\nProcessing {path_for_meta.name}...")
-
-        creation_date = get_exif_date(path_for_meta)
-        year = creation_date.strftime('%Y')
-        month_name = creation_date.strftime('%B')
-        day_folder = creation_date.strftime('%d-%A')
+    try:
+        source_img = open_source_image(path_for_meta, settings.get('raw_full_quality', False))
+        if source_img:
+            with source_img as img:
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((settings['resize_w'], settings['resize_h']))
+                renditions.save_rendition(img, resized_path_obsidian, settings) # Save directly to Obsidian path
+                print(f"🖼️  Created Obsidian file: {resized_path_obsidian}")
+        else: raise ValueError("Could not extract image data.")
+    except Exception as e:
+        print(f"❗️ Error resizing {path_for_meta.name}: {e}")
+        return {'source': item['source'], 'status': 'error', 'error': str(e)}
 
-        new_base_name = f"{base_name}{current_number:03d}"
-        final_dest_dir = dest_dir / year / month_name / day_folder
-        obsidian_dest_dir = obsidian_dir / year / month_name / day_folder
-        final_dest_dir.mkdir(parents=True, exist_ok=True)
-        obsidian_dest_dir.mkdir(parents=True, exist_ok=True)
-        
-        resized_name = f"{new_base_name}-R.jpg"
-        resized_path_obsidian = obsidian_dest_dir / resized_name # Define final path
+    # --- MOVE FIRST ---
+    # Move the original files to a temporary location before doing anything else
+    # to avoid filesystem race conditions. Each item gets its own temp folder, so
+    # items running in parallel (or two cards with the same file names) never collide.
+    temp_dir = Path(tempfile.mkdtemp(prefix='photoflow_processing_'))
+    temp_jpg_path, temp_raw_path = None, None
+    if item['jpg_path']:
+        temp_jpg_path = temp_dir / Path(item['jpg_path']).name
+        shutil.move(item['jpg_path'], temp_jpg_path)
+    if item['raw_path']:
+        temp_raw_path = temp_dir / Path(item['raw_path']).name
+        shutil.move(item['raw_path'], temp_raw_path)
         
-        try:
-            img_data = None
-            if path_for_meta.suffix.lower() in RAW_EXTENSIONS:
-                command = ['exiftool', '-b', '-PreviewImage', str(path_for_meta)]
-                result = subprocess.run(command, capture_output=True, check=True)
-                img_data = result.stdout
-            else:
-                with open(path_for_meta, 'rb') as f: img_data = f.read()
-            if img_data:
-                with Image.open(io.BytesIO(img_data)) as img:
-                    img = ImageOps.exif_transpose(img)
-                    img.thumbnail((settings['resize_w'], settings['resize_h']))
-                    img.save(resized_path_obsidian, 'JPEG', quality=85, exif=b"") # Save directly to Obsidian path
-                    print(f"🖼️  Created Obsidian file: {resized_path_obsidian}")
-            else: raise ValueError("Could not extract image data.")
-        except Exception as e:
-            print(f"❗️ Error resizing {path_for_meta.name}: {e}")
-            continue
+    path_for_meta = temp_raw_path or temp_jpg_path
 
-        # --- MOVE FIRST ---
-        # Move the original files to a temporary location before doing anything else
-        # to avoid filesystem race conditions.
-        temp_dir = Path('/tmp/photoflow_processing')
-        temp_dir.mkdir(exist_ok=True)
-        
-        temp_jpg_path, temp_raw_path = None, None
-        if item['jpg_path']:
-            temp_jpg_path = temp_dir / Path(item['jpg_path']).name
-            shutil.move(item['jpg_path'], temp_jpg_path)
-        if item['raw_path']:
-            temp_raw_path = temp_dir / Path(item['raw_path']).name
-            shutil.move(item['raw_path'], temp_raw_path)
-            
-        path_for_meta = temp_raw_path or temp_jpg_path
+    # --- METADATA FIRST ---
+    print("✍️  Copying all metadata to resized file...")
+    copy_meta_args = [
+        '-m', 
+        '-overwrite_original', 
+        '-tagsFromFile', str(path_for_meta), 
+        '-all:all', 
+        '--Orientation#', # Exclude the orientation tag
+        str(resized_path_obsidian)
+    ]
+    run_exiftool(copy_meta_args)
 
-        # --- METADATA FIRST ---
-        print("✍️  Copying all metadata to resized file...")
-        copy_meta_args = [
-            '-m', 
-            '-overwrite_original', 
-            '-tagsFromFile', str(path_for_meta), 
-            '-all:all', 
-            '--Orientation#', # Exclude the orientation tag
-            str(resized_path_obsidian)
-        ]
-        run_exiftool(copy_meta_args)
+    files_to_tag = []
+    if temp_jpg_path: files_to_tag.append(str(temp_jpg_path))
+    if temp_raw_path: files_to_tag.append(str(temp_raw_path))
+    
+    if tags and files_to_tag:
+        print(f"✍️  Writing tags: {', '.join(tags)}")
+        for file_to_tag in files_to_tag:
+            tag_args = ['-m', '-overwrite_original']
+            for tag in tags:
+                tag_args.append(f'-xmp:subject+={tag}')
+            tag_args.append(file_to_tag)
+            run_exiftool(tag_args)
 
-        files_to_tag = []
-        if temp_jpg_path: files_to_tag.append(str(temp_jpg_path))
-        if temp_raw_path: files_to_tag.append(str(temp_raw_path))
-        
-        if tags and files_to_tag:
-            print(f"✍️  Writing tags: {', '.join(tags)}")
-            for file_to_tag in files_to_tag:
-                tag_args = ['-m', '-overwrite_original']
-                for tag in tags:
-                    tag_args.append(f'-xmp:subject+={tag}')
-                tag_args.append(file_to_tag)
-                run_exiftool(tag_args)
-
-        print("\n🚚 Moving files to final destination...")
+    print("\n🚚 Moving files to final destination...")
+    destinations, checksums = [], {}
+    try:
+        # Each copy is hashed as it is written, read back to verify, and logged
+        # in the day folder's checksum manifest (see transfer.py).
         if temp_jpg_path:
-            shutil.move(temp_jpg_path, final_dest_dir / f"{new_base_name}{Path(temp_jpg_path).suffix}")
+            checksums[item['dest_jpg']] = land_file(temp_jpg_path, item['dest_jpg'], settings)
+            destinations.append(item['dest_jpg'])
         if temp_raw_path:
-            shutil.move(temp_raw_path, final_dest_dir / f"{new_base_name}{Path(temp_raw_path).suffix}")
-        shutil.copy(resized_path_obsidian, final_dest_dir / resized_path_obsidian.name)
+            checksums[item['dest_raw']] = land_file(temp_raw_path, item['dest_raw'], settings)
+            destinations.append(item['dest_raw'])
+        checksums[item['rendition_archive']] = land_file(resized_path_obsidian, item['rendition_archive'],
+                                                         settings, keep_source=True)
+    except (transfer.TransferError, OSError) as e:
+        # Whatever did not verify is still in the temp folder; leave it there for recovery.
+        print(f"❗️ Transfer failed, originals kept in {temp_dir}: {e}")
+        return {'source': item['source'], 'status': 'error', 'error': str(e), 'destinations': destinations}
+    try: temp_dir.rmdir()
+    except OSError: pass
+    return {'source': item['source'], 'status': 'ok', 'destinations': destinations,
+            'rendition': item['rendition'], 'checksums': checksums}
+
+def execute_plan(plan, progress=None, workers=1):
+    """Executes a plan from plan_batch, optionally several items at a time. Returns one result per item."""
+    # Settle the checksum algorithm before any file leaves the card.
+    settings = dict(plan['settings'], checksum_algorithm=transfer.resolve_algorithm(plan['settings']))
+    items = plan['items']
+    planner.create_directories(plan)
+    results = [{'source': item['source'], 'status': 'skipped', 'error': '; '.join(item['conflicts'])}
+               for item in plan['skipped']]
+    for item in plan['skipped']:
+        print(f"⚠️  Skipping {Path(item['source']).name}: {'; '.join(item['conflicts'])}")
+    
+    # Work through the card in on-disk order, with the next few photos read ahead
+    # into the page cache so exiftool, Pillow and the copy all read from memory.
+    item_by_path = {}
+    for item in items:
+        for path in (item['jpg_path'], item['raw_path']):
+            if path: item_by_path[path] = item
+    ordered_paths = readorder.disk_order(list(item_by_path))
+    items = list({id(item_by_path[path]): item_by_path[path] for path in ordered_paths}.values())
+    readahead = readorder.ReadAhead(ordered_paths, settings.get('readahead_files', readorder.DEFAULT_DEPTH))
+
+    def run_item(item):
+        item_paths = [path for path in (item['jpg_path'], item['raw_path']) if path]
+        for path in item_paths: readahead.start(path)
+        # No readahead.finish(): the item moves the card files into its temp folder, and
+        # moving them off the card unlinks them there, which frees their cached pages.
+        # (Dropping them before the move would make the move read the card again.)
+        return execute_plan_item(item, settings)
 
+    done = 0
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_item, item) for item in items]
+            for future in as_completed(futures):
+                results.append(future.result())
+                done += 1
+                if progress: progress(done, len(items), None)
+    else:
+        for item in items:
+            if progress: progress(done, len(items), Path(item['source']).name)
+            results.append(run_item(item))
+            done += 1
+    if progress: progress(len(items), len(items), None)
+    if settings.get('staging_dir') and items:
+        # The fast tier is written; the archive copies continue in the background.
+        migrator.start_background(settings)
+        print("📦 Files staged; migrating them to the archive in the background.")
+    return results
+
+def process_batch(selection_data, settings, progress=None):
+    """Processes photos using only the main batch settings.
+
+    The whole batch is planned first (see plan_batch), then executed.
+    progress, if given, is called as progress(done, total, current_name) as
+    items complete. Returns one result dict per item.
+    """
+    print("\n--- Starting Batch Processing Workflow ---")
+    plan = plan_batch(selection_data, settings)
+    results = execute_plan(plan, progress, settings.get('workers', 1))
     print("\n🎉 Workflow complete!")
+    return results
 
 def process_photos_individual(review_data, settings):
     """Processes photos using the detailed data from the Review Window."""
     print("\n--- Starting Individual Processing Workflow ---")
+    settings = dict(settings, checksum_algorithm=transfer.resolve_algorithm(settings))
     
     common_tags = settings['tags']
     dest_dir = Path(settings['dest_dir'].strip(' "'))
     obsidian_dir = Path(settings['obsidian_dir'].strip(' "'))
+    temp_dir = Path(tempfile.mkdtemp(prefix='photoflow_processing_'))
     
     for item in review_data:
         path_for_meta = Path(item['raw_path'] or item['jpg_path'])
@@ -169,17 +327,18 @@ def process_photos_individual(review_data, settings):
         new_base_name = item.get('user_filename') or f"file_{creation_date.strftime('%Y%m%d_%H%M%S')}"
         final_dest_dir = dest_dir / year / month_name / day_folder
         obsidian_dest_dir = obsidian_dir / year / month_name / day_folder
-        final_dest_dir.mkdir(parents=True, exist_ok=True)
+        # Same collision policy as batch ingests (see planner.py).
+        new_base_name, paths, conflicts = planner.choose_paths(item, new_base_name, final_dest_dir, obsidian_dest_dir, settings)
+        if conflicts:
+            print(f"⚠️  Skipping {path_for_meta.name}: {'; '.join(conflicts)}")
+            continue
+        if not settings.get('staging_dir'): final_dest_dir.mkdir(parents=True, exist_ok=True)
         obsidian_dest_dir.mkdir(parents=True, exist_ok=True)
         
-        resized_name = f"{new_base_name}-R.jpg"
-        resized_path_obsidian = obsidian_dest_dir / resized_name # Define final path
+        resized_path_obsidian = paths['rendition'] # Define final path
 
         # --- MOVE FIRST ---
         # Move the original files to a temporary location before doing anything else.
-        temp_dir = Path('/tmp/photoflow_processing')
-        temp_dir.mkdir(exist_ok=True)
-        
         temp_jpg_path, temp_raw_path = None, None
         if item['jpg_path']:
             temp_jpg_path = temp_dir / Path(item['jpg_path']).name
@@ -219,18 +378,12 @@ def process_photos_individual(review_data, settings):
         # --- STEP 2: Create the resized file for Obsidian ---
         
         try:
-            img_data = None
-            if path_for_meta.suffix.lower() in RAW_EXTENSIONS:
-                command = ['exiftool', '-b', '-PreviewImage', str(path_for_meta)]
-                result = subprocess.run(command, capture_output=True, check=True)
-                img_data = result.stdout
-            else:
-                with open(path_for_meta, 'rb') as f: img_data = f.read()
-            if img_data:
-                with Image.open(io.BytesIO(img_data)) as img:
+            source_img = open_source_image(path_for_meta, settings.get('raw_full_quality', False))
+            if source_img:
+                with source_img as img:
                     img = ImageOps.exif_transpose(img)
                     img.thumbnail((settings['resize_w'], settings['resize_h']))
-                    img.save(resized_path_obsidian, 'JPEG', quality=85, exif=b"") # Save directly to Obsidian path
+                    renditions.save_rendition(img, resized_path_obsidian, settings) # Save directly to Obsidian path
                     print(f"🖼️  Created Obsidian file: {resized_path_obsidian}")
             else: raise ValueError("Could not extract image data.")
         except Exception as e:
@@ -250,10 +403,21 @@ def process_photos_individual(review_data, settings):
         run_exiftool(copy_meta_args)
 
         print("\n🚚 Moving fully tagged files to final destination...")
-        if temp_jpg_path:
-            shutil.move(temp_jpg_path, final_dest_dir / f"{new_base_name}{Path(temp_jpg_path).suffix}")
-        if temp_raw_path:
-            shutil.move(temp_raw_path, final_dest_dir / f"{new_base_name}{Path(temp_raw_path).suffix}")
-        shutil.copy(resized_path_obsidian, final_dest_dir / resized_path_obsidian.name)
+        # Verified and recorded in the checksum manifest like batch ingests; with a
+        # staging tier, land_file stages the files and queues them for the migrator.
+        try:
+            if temp_jpg_path:
+                land_file(temp_jpg_path, paths['dest_jpg'], settings)
+            if temp_raw_path:
+                land_file(temp_raw_path, paths['dest_raw'], settings)
+            land_file(resized_path_obsidian, paths['rendition_archive'], settings, keep_source=True)
+        except (transfer.TransferError, OSError) as e:
+            # Whatever did not verify is still in the temp folder; leave it there for recovery.
+            print(f"❗️ Transfer failed, originals kept in {temp_dir}: {e}")
+            continue
+        if settings.get('staging_dir'):
+            migrator.start_background(settings)
 
+    try: temp_dir.rmdir() # Only succeeds if nothing was left behind.
+    except OSError: pass
     print("\n🎉 Workflow complete!")
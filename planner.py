@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Up-front ingest planning.
+
+A plan is worked out for the whole selection before any file is touched:
+every destination and rendition path is computed in one pass from
+prefetched capture dates, collisions with the archive and within the batch
+are detected, and all directories are created at once. Plans are plain
+JSON, so they can be shown as a dry run, saved, and executed later (in any
+order, or in parallel) by photoflow.execute_plan.
+
+Usage: python3 planner.py show PLAN.json
+       python3 planner.py execute PLAN.json [--workers N]
+"""
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import renditions
+
+# What to do when a planned path is already taken:
+#   'skip'      leave the item out of the plan (the default; nothing is overwritten)
+#   'rename'    append _2, _3, ... to the new base name until every path is free
+#   'overwrite' replace the existing file (the pre-planner behaviour)
+COLLISION_POLICIES = ('skip', 'rename', 'overwrite')
+
+
+def staged_path(path, settings):
+    """Where a destination path lands first: its place on the staging tier, or itself without one."""
+    staging_dir = settings.get('staging_dir', '').strip(' "')
+    if not staging_dir:
+        return Path(path)
+    return Path(staging_dir) / Path(path).relative_to(settings['dest_dir'].strip(' "'))
+
+
+def _item_paths(item, new_base_name, final_dest_dir, obsidian_dest_dir, rendition_ext):
+    paths = {}
+    if item['jpg_path']:
+        paths['dest_jpg'] = final_dest_dir / f"{new_base_name}{Path(item['jpg_path']).suffix}"
+    if item['raw_path']:
+        paths['dest_raw'] = final_dest_dir / f"{new_base_name}{Path(item['raw_path']).suffix}"
+    resized_name = f"{new_base_name}-R{rendition_ext}"
+    paths['rendition'] = obsidian_dest_dir / resized_name
+    paths['rendition_archive'] = final_dest_dir / resized_name
+    return paths
+
+
+def choose_paths(item, base, final_dest_dir, obsidian_dest_dir, settings, claimed=()):
+    """Picks the item's destination paths under the collision policy.
+
+    Returns (new_base_name, paths, conflicts); conflicts is empty when the
+    paths are free to write (or the policy is 'overwrite').
+    """
+    policy = settings.get('on_collision', 'skip')
+    rendition_ext = renditions.extension(settings)
+    new_base_name, attempt = base, 1
+    while True:
+        paths = _item_paths(item, new_base_name, final_dest_dir, obsidian_dest_dir, rendition_ext)
+        conflicts = []
+        for kind, path in paths.items():
+            if path in claimed:
+                conflicts.append(f"{path} is also planned for another photo in this batch")
+            elif policy != 'overwrite' and path.exists():
+                conflicts.append(f"{path} already exists in the archive")
+            elif policy != 'overwrite' and kind != 'rendition' and staged_path(path, settings).exists():
+                conflicts.append(f"{path} is still waiting on the staging tier to be migrated")
+        if not conflicts or policy != 'rename':
+            return new_base_name, paths, conflicts
+        attempt += 1
+        new_base_name = f"{base}_{attempt}"
+
+
+def recheck_item(item, settings):
+    """Re-runs the collision check for a planned item just before it is executed.
+
+    A plan can be saved and run later, when files may have appeared at its
+    destinations. Returns (item, conflicts); under the 'rename' policy the
+    returned item may carry new paths.
+    """
+    final_dest_dir, obsidian_dest_dir = Path(item['rendition_archive']).parent, Path(item['rendition']).parent
+    base = item.get('base_name', item['new_base_name'])
+    new_base_name, paths, conflicts = choose_paths(item, base, final_dest_dir, obsidian_dest_dir, settings)
+    if new_base_name != item['new_base_name']:
+        print(f"⚠️  {item['new_base_name']} was taken since the plan was made; using {new_base_name}.")
+    item = dict(item, new_base_name=new_base_name, conflicts=conflicts)
+    item.update({kind: str(path) for kind, path in paths.items()})
+    return item, conflicts
+
+
+def plan_batch(selection_data, settings, dates):
+    """Builds the plan for a batch.
+
+    dates maps each item's metadata path (raw_path or jpg_path) to its capture
+    datetime, as returned by photoflow.get_exif_dates.
+    """
+    dest_dir = Path(settings['dest_dir'].strip(' "'))
+    obsidian_dir = Path(settings['obsidian_dir'].strip(' "'))
+    claimed = set()
+    items, skipped, directories = [], [], set()
+
+    for i, item in enumerate(selection_data):
+        path_for_meta = item['raw_path'] or item['jpg_path']
+        creation_date = dates.get(str(Path(path_for_meta))) or datetime.now()
+        day_path = Path(creation_date.strftime('%Y')) / creation_date.strftime('%B') / creation_date.strftime('%d-%A')
+        final_dest_dir, obsidian_dest_dir = dest_dir / day_path, obsidian_dir / day_path
+
+        base = f"{settings['base_name']}{settings['start_number'] + i:03d}"
+        new_base_name, paths, conflicts = choose_paths(item, base, final_dest_dir, obsidian_dest_dir, settings, claimed)
+
+        planned = {'index': i, 'source': path_for_meta, 'jpg_path': item['jpg_path'], 'raw_path': item['raw_path'],
+                   'captured': creation_date.isoformat(), 'base_name': base, 'new_base_name': new_base_name,
+                   'conflicts': conflicts}
+        planned.update({kind: str(path) for kind, path in paths.items()})
+        if conflicts:
+            skipped.append(planned)
+            continue
+        claimed.update(paths.values())
+        # With a staging tier, only the staging folders are created now; the migrator makes the archive's.
+        directories.update({staged_path(final_dest_dir, settings), obsidian_dest_dir})
+        items.append(planned)
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'settings': settings,
+        'directories': sorted(str(d) for d in directories),
+        'items': items,
+        'skipped': skipped,
+    }
+
+
+def create_directories(plan):
+    """Creates every directory the plan writes to, once each."""
+    for directory in plan['directories']:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+
+def format_plan(plan):
+    """Renders a plan as a human-readable dry run."""
+    lines = [f"Plan created {plan['created']}: {len(plan['items'])} photos to ingest, "
+             f"{len(plan['skipped'])} skipped, {len(plan['directories'])} folders."]
+    staging_dir = plan['settings'].get('staging_dir', '').strip(' "')
+    if staging_dir:
+        lines.append(f"Archive files land in {staging_dir} first and are migrated in the background.")
+    for item in plan['items']:
+        lines.append(f"\n{Path(item['source']).name}  ({item['captured']})")
+        for kind in ('dest_jpg', 'dest_raw', 'rendition', 'rendition_archive'):
+            if item.get(kind):
+                lines.append(f"   → {item[kind]}")
+    if plan['skipped']:
+        lines.append("\n⚠️  Skipped because of collisions:")
+        for item in plan['skipped']:
+            lines.append(f"\n{Path(item['source']).name}")
+            for conflict in item['conflicts']:
+                lines.append(f"   ✗ {conflict}")
+    return "\n".join(lines)
+
+
+def save_plan(plan, path):
+    with open(path, 'w') as f:
+        json.dump(plan, f, indent=2)
+
+
+def load_plan(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Show or execute a saved PhotoFlow ingest plan")
+    parser.add_argument('command', choices=['show', 'execute'])
+    parser.add_argument('plan')
+    parser.add_argument('--workers', type=int, default=1, help="photos to process in parallel")
+    args = parser.parse_args()
+
+    plan = load_plan(args.plan)
+    print(format_plan(plan))
+    if args.command == 'execute':
+        import photoflow
+        results = photoflow.execute_plan(plan, workers=args.workers)
+        import migrator
+        background = migrator.background()
+        if background:
+            print("📦 Waiting for the staged files to reach the archive (Ctrl+C leaves them queued)...")
+            background.stop(); background.thread.join()
+            background.drain()
+        sys.exit(0 if all(r['status'] == 'ok' for r in results) else 1)
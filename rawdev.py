@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""RAW development fallback for files without a usable embedded preview.
+
+RAW files are demosaiced with rawpy in a pool of worker processes, so neither
+the GIL nor the GTK main loop is held while LibRaw works. Every developed
+image is written to a disk cache keyed by the file's identity, which means
+each RAW is only developed once per mode, no matter how many times the
+thumbnail view, the review window or the engine ask for it.
+"""
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+RAW_CACHE_DIR = Path.home() / ".cache" / "PhotoFlow" / "raw"
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _cache_key(file_path, half_size):
+    # The key deliberately ignores the parent directory: the engine moves
+    # originals into a temp folder before rendering, and that should still
+    # hit the cache as long as the file itself is untouched.
+    stat = file_path.stat()
+    mode = "half" if half_size else "full"
+    identity = f"{file_path.name}|{stat.st_size}|{stat.st_mtime_ns}|{mode}"
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+
+def cache_path_for(file_path, half_size=True):
+    """Returns where the developed image for file_path is (or will be) cached."""
+    file_path = Path(file_path)
+    return RAW_CACHE_DIR / f"{_cache_key(file_path, half_size)}.jpg"
+
+
+def _develop_to_file(file_path, cache_file, half_size):
+    """Worker entry point. Runs in a child process."""
+    import rawpy
+    from PIL import Image
+
+    with rawpy.imread(str(file_path)) as raw:
+        rgb = raw.postprocess(half_size=half_size, use_camera_wb=True, output_bps=8)
+    img = Image.fromarray(rgb)
+    # Write to a temp name and rename so a half-written file is never served from the cache.
+    tmp_file = Path(f"{cache_file}.{os.getpid()}.part")
+    img.save(tmp_file, 'JPEG', quality=95)
+    os.replace(tmp_file, cache_file)
+    return str(cache_file)
+
+
+def get_executor():
+    """Returns the shared process pool, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # 'spawn' rather than fork: the GUI process is multi-threaded and
+            # forking it with GTK loaded is not safe.
+            context = multiprocessing.get_context('spawn')
+            _executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 2, mp_context=context)
+        return _executor
+
+
+def develop_async(file_path, half_size=True):
+    """Queues a RAW for development and returns a Future resolving to the cached JPEG path."""
+    file_path = Path(file_path)
+    cache_file = cache_path_for(file_path, half_size)
+    if cache_file.exists():
+        future = Future()
+        future.set_result(str(cache_file))
+        return future
+
+    RAW_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with _in_flight_lock:
+        # Two callers asking for the same file share one job.
+        future = _in_flight.get(cache_file)
+        if future is not None:
+            return future
+        future = get_executor().submit(_develop_to_file, str(file_path), str(cache_file), half_size)
+        _in_flight[cache_file] = future
+    future.add_done_callback(lambda f: _forget(cache_file))
+    return future
+
+
+def _forget(cache_file):
+    with _in_flight_lock:
+        _in_flight.pop(cache_file, None)
+
+
+def develop(file_path, half_size=True):
+    """Develops a RAW (or fetches it from the cache) and returns the JPEG path, or None on failure."""
+    try:
+        return Path(develop_async(file_path, half_size).result())
+    except ImportError:
+        print("❌ ERROR: 'rawpy' is not installed, cannot develop RAW files.")
+    except Exception as e:
+        print(f"❗️ Error developing {Path(file_path).name}: {e}")
+    return None
+
+
+def shutdown():
+    """Stops the worker pool. Called when the application quits."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Rendition formats for the Obsidian copies.
+
+Each format has encoder presets trading encode time for file size:
+'fast' encodes quickest, 'small' produces the smallest files, 'balanced'
+sits in between. AVIF is only offered when Pillow can write it (natively
+from Pillow 11.2, or through pillow-avif-plugin). A configured format this
+Pillow build can't write falls back to JPEG, with a warning.
+
+benchmark() encodes a sample of the user's own photos with every format and
+preset and reports bytes per image and encode time:
+
+    python3 renditions.py benchmark [--size 1600] PHOTO...
+"""
+import importlib
+import io
+import time
+from pathlib import Path
+
+DEFAULT_FORMAT = 'jpeg'
+DEFAULT_PRESET = 'balanced'
+PRESETS = ('fast', 'balanced', 'small')
+
+_available = None
+_warned = set()
+
+# format -> (file extension, Pillow format name, {preset: save options})
+FORMATS = {
+    'jpeg': ('.jpg', 'JPEG', {
+        'fast': {'quality': 85},
+        'balanced': {'quality': 85, 'optimize': True},
+        'small': {'quality': 78, 'optimize': True},
+    }),
+    'progressive-jpeg': ('.jpg', 'JPEG', {
+        'fast': {'quality': 85, 'progressive': True},
+        'balanced': {'quality': 85, 'progressive': True, 'optimize': True},
+        'small': {'quality': 78, 'progressive': True, 'optimize': True, 'subsampling': '4:2:0'},
+    }),
+    'webp': ('.webp', 'WEBP', {
+        'fast': {'quality': 80, 'method': 2},
+        'balanced': {'quality': 80, 'method': 4},
+        'small': {'quality': 75, 'method': 6},
+    }),
+    'avif': ('.avif', 'AVIF', {
+        'fast': {'quality': 60, 'speed': 8},
+        'balanced': {'quality': 60, 'speed': 6},
+        'small': {'quality': 50, 'speed': 4},
+    }),
+}
+
+
+def _register_plugins():
+    """Registers pillow-avif-plugin's AVIF encoder on Pillow builds without a native one."""
+    try:
+        importlib.import_module('pillow_avif')
+    except ImportError:
+        pass
+
+
+def available_formats():
+    """Formats this Pillow build can write."""
+    global _available
+    if _available is None:
+        from PIL import Image, features
+        formats = ['jpeg', 'progressive-jpeg']
+        if features.check('webp'):
+            formats.append('webp')
+        _register_plugins()
+        Image.init()
+        if 'AVIF' in Image.SAVE:
+            formats.append('avif')
+        _available = formats
+    return _available
+
+
+def resolve_format(settings):
+    """The format the given settings actually produce: the configured one, or JPEG if it can't be written."""
+    fmt = settings.get('rendition_format', DEFAULT_FORMAT)
+    if fmt not in FORMATS:
+        return DEFAULT_FORMAT
+    if fmt not in available_formats():
+        if fmt not in _warned:
+            _warned.add(fmt)
+            print(f"⚠️  This Pillow build can't write {fmt.upper()} renditions; writing JPEG instead.")
+        return DEFAULT_FORMAT
+    return fmt
+
+
+def extension(settings):
+    """File extension of the renditions the given settings produce."""
+    return FORMATS[resolve_format(settings)][0]
+
+
+def _save_options(fmt, preset):
+    ext, pil_format, presets = FORMATS[fmt]
+    return pil_format, presets.get(preset, presets[DEFAULT_PRESET])
+
+
+def save_rendition(img, path, settings):
+    """Encodes img to path in the configured format. Metadata is stripped; exiftool copies it afterwards."""
+    fmt = resolve_format(settings)  # also registers the AVIF plugin in this process
+    pil_format, options = _save_options(fmt, settings.get('rendition_preset', DEFAULT_PRESET))
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    img.save(path, pil_format, exif=b"", **options)
+
+
+def benchmark(file_paths, size=(1600, 1600), formats=None):
+    """Encodes each photo with every available format and preset.
+
+    Returns a list of dicts with format, preset, images, avg_bytes and avg_ms.
+    """
+    from PIL import ImageOps
+    import photoflow
+
+    images = []
+    for file_path in file_paths:
+        try:
+            img = photoflow.open_source_image(Path(file_path))
+            if img is None:
+                continue
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail(size)
+            images.append(img.convert('RGB'))
+        except Exception as e:
+            # A corrupt file or a pulled card shouldn't stop the benchmark; use the other samples.
+            print(f"❗️ Skipping {Path(file_path).name} in the benchmark: {e}")
+    if not images:
+        return []
+
+    results = []
+    for fmt in formats or available_formats():
+        for preset in PRESETS:
+            pil_format, options = _save_options(fmt, preset)
+            total_bytes, total_seconds = 0, 0.0
+            for img in images:
+                buffer = io.BytesIO()
+                start = time.perf_counter()
+                img.save(buffer, pil_format, **options)
+                total_seconds += time.perf_counter() - start
+                total_bytes += buffer.tell()
+            results.append({'format': fmt, 'preset': preset, 'images': len(images),
+                            'avg_bytes': total_bytes / len(images),
+                            'avg_ms': total_seconds * 1000 / len(images)})
+    return results
+
+
+def format_benchmark(results):
+    if not results:
+        return "No images could be decoded for the benchmark."
+    lines = [f"{'Format':<18}{'Preset':<10}{'KB/image':>10}{'ms/image':>10}"]
+    for r in results:
+        lines.append(f"{r['format']:<18}{r['preset']:<10}{r['avg_bytes'] / 1024:>10.1f}{r['avg_ms']:>10.1f}")
+    lines.append(f"({results[0]['images']} images)")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark rendition formats on your own photos")
+    parser.add_argument('command', choices=['benchmark'])
+    parser.add_argument('photos', nargs='+')
+    parser.add_argument('--size', type=int, default=1600, help="long edge of the renditions")
+    args = parser.parse_args()
+    print(format_benchmark(benchmark(args.photos, (args.size, args.size))))
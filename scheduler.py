@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Concurrent multi-card ingest.
+
+Several sources (cards) are ingested at once, one thread per source, while
+at most `max_readers_per_device` sources read from any one physical device
+and at most `max_writers_per_device` write to any one. Two cards in the
+same reader are therefore ingested one after the other, cards in different
+readers run in parallel, and the archive disk is never handed more streams
+than it can take. A source whose devices can't be worked out (unmounted
+card, unusual destination) is ingested without a device slot.
+
+A "physical device" is worked out from the file's st_dev: partitions are
+folded into their disk, the LUNs of one USB card reader are folded into the
+reader, and network or virtual filesystems fall back to their mount source.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+import photoflow
+
+MOUNTINFO = '/proc/self/mountinfo'
+DEFAULT_MAX_READERS_PER_DEVICE = 1
+DEFAULT_MAX_WRITERS_PER_DEVICE = 2
+
+
+def _mount_sources():
+    """Maps 'major:minor' to the mount source (e.g. 'nas:/photos') from mountinfo."""
+    sources = {}
+    try:
+        with open(MOUNTINFO) as f:
+            for line in f:
+                fields = line.split()
+                separator = fields.index('-')
+                sources[fields[2]] = fields[separator + 2]
+    except (OSError, ValueError, IndexError):
+        pass
+    return sources
+
+
+def _existing_parent(path):
+    path = Path(path)
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+def physical_device(path):
+    """Returns a key naming the physical device that holds path (or would, once created)."""
+    st_dev = os.stat(_existing_parent(path)).st_dev
+    major, minor = os.major(st_dev), os.minor(st_dev)
+    sys_path = Path(f'/sys/dev/block/{major}:{minor}')
+    if sys_path.exists():
+        real = sys_path.resolve()
+        if (real / 'partition').exists():
+            real = real.parent
+        parts = real.parts
+        # A multi-slot USB reader exposes each slot as its own disk under a
+        # single SCSI host; they share one bus, so treat them as one device.
+        if 'usb' in str(real):
+            for i, part in enumerate(parts):
+                if part.startswith('host'):
+                    return str(Path(*parts[:i + 1]))
+        return real.name
+    return _mount_sources().get(f'{major}:{minor}', f'dev-{major}:{minor}')
+
+
+class SourceJob:
+    """One source folder's selection, with its own progress counters."""
+
+    def __init__(self, name, selection_data, settings):
+        self.name = name
+        self.selection_data = selection_data
+        self.settings = settings
+        self.read_device = None
+        self.write_device = None
+        self.item_bytes = [0] * len(selection_data)
+        self.total_bytes = 0
+        self.bytes_done = 0
+        self.done = 0
+        self.status = 'queued'
+        self.results = None
+        self.started = None
+        self.finished = None
+
+    def resolve(self):
+        """Works out the devices and sizes. Touches the disks, so it runs on the worker thread."""
+        first = self.selection_data[0]
+        # Staged ingests write to the staging tier, not to the archive.
+        destination = (self.settings.get('staging_dir') or self.settings['dest_dir']).strip(' "')
+        try:
+            self.read_device = physical_device(first['raw_path'] or first['jpg_path'])
+            self.write_device = physical_device(destination)
+        except OSError as e:
+            print(f"⚠️  Could not tell which devices {self.name} uses ({e}); ingesting it without a device slot.")
+            self.read_device = self.write_device = None
+        self.item_bytes = [sum(os.path.getsize(p) for p in (item['jpg_path'], item['raw_path']) if p and os.path.exists(p))
+                           for item in self.selection_data]
+        self.total_bytes = sum(self.item_bytes)
+
+    @property
+    def total(self):
+        return len(self.selection_data)
+
+    def rate(self):
+        """Bytes per second for this source so far."""
+        if not self.started:
+            return 0.0
+        return self.bytes_done / max((self.finished or time.time()) - self.started, 1e-6)
+
+
+class IngestScheduler:
+    """Runs several SourceJobs at once with a per-device cap on concurrent readers.
+
+    on_update(scheduler) is called from worker threads whenever any job moves.
+    """
+
+    def __init__(self, max_readers_per_device=DEFAULT_MAX_READERS_PER_DEVICE, on_update=None,
+                 max_writers_per_device=DEFAULT_MAX_WRITERS_PER_DEVICE):
+        self.max_readers_per_device = max_readers_per_device
+        self.max_writers_per_device = max_writers_per_device
+        self.on_update = on_update
+        self.jobs = []
+        self.device_slots = {}
+        self.lock = threading.Lock()
+        self.started = None
+
+    def add(self, name, selection_data, settings):
+        job = SourceJob(name, selection_data, settings)
+        self.jobs.append(job)
+        return job
+
+    def _slots(self, job):
+        """The semaphores a job must hold, always in the same order (reads before writes) to avoid deadlock."""
+        wanted = []
+        if job.read_device: wanted.append(('read', job.read_device))
+        # Reading and writing the same device is one stream of work for it, not two.
+        if job.write_device and job.write_device != job.read_device: wanted.append(('write', job.write_device))
+        with self.lock:
+            for key in wanted:
+                if key not in self.device_slots:
+                    limit = self.max_readers_per_device if key[0] == 'read' else self.max_writers_per_device
+                    self.device_slots[key] = threading.Semaphore(limit)
+            return [self.device_slots[key] for key in wanted]
+
+    def _notify(self):
+        if self.on_update: self.on_update(self)
+
+    def _run_job(self, job):
+        job.resolve()
+        print(f"   {job.name}: reading from {job.read_device}, writing to {job.write_device}")
+        slots = self._slots(job)
+        for slot in slots: slot.acquire()
+        try:
+            job.status = 'running'
+            job.started = time.time()
+            self._notify()
+
+            def progress(done, total, current):
+                # Items the planner skipped never reach the progress callback; count them as done.
+                job.done = done + (job.total - total)
+                job.bytes_done = sum(job.item_bytes[:job.done])
+                self._notify()
+
+            try:
+                job.results = photoflow.process_batch(job.selection_data, job.settings, progress=progress)
+                job.status = 'done'
+            except Exception as e:
+                print(f"❗️ Ingest of {job.name} failed: {e}")
+                job.status = 'failed'
+            job.finished = time.time()
+        finally:
+            for slot in reversed(slots): slot.release()
+        self._notify()
+
+    def run(self):
+        """Ingests every queued source and blocks until all of them have finished."""
+        self.started = time.time()
+        print(f"\n--- Ingesting {len(self.jobs)} sources ---")
+        threads = [threading.Thread(target=self._run_job, args=(job,)) for job in self.jobs]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        print(f"\n🎉 All sources ingested: {self.bytes_done() / 1e6:.1f} MB at {self.throughput() / 1e6:.1f} MB/s")
+        return self.jobs
+
+    def bytes_done(self):
+        return sum(job.bytes_done for job in self.jobs)
+
+    def throughput(self):
+        """Combined bytes per second across all sources since run() started."""
+        if not self.started:
+            return 0.0
+        finished = [job.finished for job in self.jobs]
+        end = max(finished) if all(finished) else time.time()
+        return self.bytes_done() / max(end - self.started, 1e-6)
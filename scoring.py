@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Sharpness and exposure scoring for auto-culling.
+
+Every image is decoded at reduced resolution (JPEG DCT scaling, or the
+embedded preview for RAWs) and scored with NumPy in the shared worker pool.
+Scores are stored in the thumbnail cache, so a folder is only scored once.
+"""
+import io
+import subprocess
+from concurrent.futures import as_completed
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+import rawdev
+import thumbcache
+from photoflow import RAW_EXTENSIONS
+
+# Long edge of the image the scores are computed on.
+SCORE_SIZE = 1024
+# Pixel values at or beyond these count as clipped.
+HIGHLIGHT_LEVEL = 250
+SHADOW_LEVEL = 5
+# The "subject in focus" heuristic looks at the sharpest tiles of a TILES x TILES grid.
+TILES = 6
+SCORE_VERSION = 1
+
+
+def _open_reduced(file_path):
+    path = Path(file_path)
+    if path.suffix.lower() in RAW_EXTENSIONS:
+        developed = rawdev.cache_path_for(path)
+        if developed.exists():
+            img = Image.open(developed)
+        else:
+            result = subprocess.run(['exiftool', '-b', '-PreviewImage', str(path)], capture_output=True)
+            if not result.stdout:
+                return None
+            img = Image.open(io.BytesIO(result.stdout))
+    else:
+        img = Image.open(path)
+    # draft() lets the JPEG decoder skip straight to a 1/2, 1/4 or 1/8 scale.
+    img.draft('RGB', (SCORE_SIZE, SCORE_SIZE))
+    img = img.convert('RGB')
+    img.thumbnail((SCORE_SIZE, SCORE_SIZE))
+    return np.asarray(img, dtype=np.float32)
+
+
+def _laplacian(gray):
+    return (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+            - 4.0 * gray[1:-1, 1:-1])
+
+
+def score_file(file_path, subject=True):
+    """Scores one image. Runs in a worker process. Returns a dict, or None if it cannot be decoded."""
+    rgb = _open_reduced(file_path)
+    if rgb is None:
+        return None
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    laplacian = _laplacian(gray)
+    scores = {
+        'score_version': SCORE_VERSION,
+        'sharpness': float(laplacian.var()),
+        # A pixel is blown if any channel clips; it is crushed only if all of them do.
+        'clipped_highlights': float((rgb.max(axis=2) >= HIGHLIGHT_LEVEL).mean()),
+        'clipped_shadows': float((rgb.max(axis=2) <= SHADOW_LEVEL).mean()),
+    }
+    if subject:
+        # Shallow depth of field blurs most of the frame on purpose, so rate
+        # the sharpest few tiles instead of the whole image.
+        h, w = laplacian.shape
+        th, tw = h // TILES, w // TILES
+        tiles = laplacian[:th * TILES, :tw * TILES].reshape(TILES, th, TILES, tw)
+        tile_variances = np.sort(tiles.var(axis=(1, 3)).ravel())
+        scores['subject_focus'] = float(tile_variances[-3:].mean())
+    scores['score'] = overall_score(scores)
+    return scores
+
+
+def overall_score(scores):
+    """Single number to rank frames by: focus, penalised for clipped highlights and shadows."""
+    focus = max(scores['sharpness'], scores.get('subject_focus', 0.0))
+    penalty = min(1.0, 4.0 * scores['clipped_highlights'] + 2.0 * scores['clipped_shadows'])
+    return float(np.log1p(focus) * (1.0 - penalty))
+
+
+def cached_scores(file_path):
+    meta = thumbcache.get_meta(file_path)
+    if meta.get('score_version') == SCORE_VERSION:
+        return meta
+    return None
+
+
+def score_files(file_paths, subject=True, on_result=None):
+    """Scores many files in parallel, reusing cached scores.
+
+    on_result(file_path, scores) is called as each result comes in (from the
+    calling thread). Returns a dict of file_path -> scores.
+    """
+    results, futures = {}, {}
+    for file_path in file_paths:
+        scores = cached_scores(file_path)
+        if scores is not None:
+            results[file_path] = scores
+            if on_result: on_result(file_path, scores)
+        else:
+            futures[rawdev.get_executor().submit(score_file, str(file_path), subject)] = file_path
+    for future in as_completed(futures):
+        file_path = futures[future]
+        try:
+            scores = future.result()
+        except Exception as e:
+            print(f"❗️ Error scoring {Path(file_path).name}: {e}")
+            continue
+        if scores is None: continue
+        thumbcache.update_meta(file_path, **scores)
+        results[file_path] = scores
+        if on_result: on_result(file_path, scores)
+    return results
+
+
+def best_per_group(groups, scores_by_key, count):
+    """Returns the keys of the top `count` frames of every group, by overall score."""
+    keep = set()
+    for group in groups:
+        ranked = sorted(group, key=lambda key: scores_by_key.get(key, {}).get('score', 0.0), reverse=True)
+        keep.update(ranked[:count])
+    return keep
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Perceptual hashing and burst grouping.
+
+Hashes are computed with NumPy from the thumbnails we already decode for the
+grid, so grouping a card costs no extra file reads. Frames are walked in
+capture order and each is only compared, in one vectorised step, with the
+frames shot up to max_gap_seconds before it, so grouping stays linear in the
+number of photos.
+"""
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+# Frames are the same burst if their hashes differ in at most this many bits...
+DEFAULT_MAX_DISTANCE = 12
+# ...and they were captured at most this many seconds apart.
+DEFAULT_MAX_GAP_SECONDS = 2.0
+
+
+def _bits_to_int(bits):
+    return int(np.packbits(bits.astype(np.uint8).ravel()).view('>u8')[0])
+
+
+def _grayscale(img, size):
+    return np.asarray(img.convert('L').resize(size, Image.LANCZOS), dtype=np.float32)
+
+
+def dhash(img):
+    """Difference hash: compares each pixel with its right-hand neighbour."""
+    pixels = _grayscale(img, (HASH_SIZE + 1, HASH_SIZE))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+_DCT_32 = _dct_matrix(HASH_SIZE * 4)
+
+
+def phash(img):
+    """DCT hash: compares the low-frequency coefficients against their median."""
+    pixels = _grayscale(img, (HASH_SIZE * 4, HASH_SIZE * 4))
+    low_freq = (_DCT_32 @ pixels @ _DCT_32.T)[:HASH_SIZE, :HASH_SIZE]
+    # The DC term only encodes overall brightness, so keep it out of the median.
+    median = np.median(low_freq.ravel()[1:])
+    return _bits_to_int(low_freq > median)
+
+
+def focus_measure(img):
+    """Cheap sharpness proxy (mean gradient energy) used to pick the best frame of a burst."""
+    pixels = np.asarray(img.convert('L'), dtype=np.float32)
+    gx = np.diff(pixels, axis=1)
+    gy = np.diff(pixels, axis=0)
+    return float((gx ** 2).mean() + (gy ** 2).mean())
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _popcount(values):
+    """Number of set bits in each element of a uint64 array."""
+    if hasattr(np, 'bitwise_count'):  # NumPy 2.0+
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def group_bursts(entries, max_distance=DEFAULT_MAX_DISTANCE, max_gap_seconds=DEFAULT_MAX_GAP_SECONDS):
+    """Groups near-duplicate frames shot close together.
+
+    entries is a list of dicts with 'key', 'phash', 'dhash', 'captured' (epoch
+    seconds) and optionally 'focus'. Returns a list of groups in capture order;
+    each group is a list of keys with its best (sharpest) frame first.
+    """
+    entries = sorted(entries, key=lambda e: e['captured'])
+    parent = list(range(len(entries)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    captured = np.array([e['captured'] for e in entries], dtype=np.float64)
+    phashes = np.fromiter((e['phash'] for e in entries), dtype=np.uint64, count=len(entries))
+    dhashes = np.fromiter((e['dhash'] for e in entries), dtype=np.uint64, count=len(entries))
+    # Only frames within max_gap_seconds can join a burst, so each frame is compared with the
+    # sliding window of frames shot just before it rather than with the whole card.
+    window_start = 0
+    for index in range(len(entries)):
+        while captured[index] - captured[window_start] > max_gap_seconds:
+            window_start += 1
+        if window_start == index:
+            continue
+        # pHash finds the candidates; dHash confirms so a pan across similar tones is not a burst.
+        window = slice(window_start, index)
+        close = ((_popcount(phashes[window] ^ phashes[index]) <= max_distance) &
+                 (_popcount(dhashes[window] ^ dhashes[index]) <= max_distance))
+        for other in np.flatnonzero(close) + window_start:
+            parent[find(index)] = find(int(other))
+
+    groups = {}
+    for index in range(len(entries)):
+        groups.setdefault(find(index), []).append(entries[index])
+    result = []
+    # entries are in capture order, so each group's first member is its earliest frame.
+    for members in sorted(groups.values(), key=lambda m: m[0]['captured']):
+        members.sort(key=lambda e: e.get('focus', 0.0), reverse=True)
+        result.append([e['key'] for e in members])
+    return result
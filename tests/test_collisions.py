@@ -0,0 +1,59 @@
+"""A saved plan run later must never overwrite files that appeared since it was made."""
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import planner
+import transfer
+
+
+class CollisionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        (self.root / 'card').mkdir()
+        (self.root / 'card' / 'IMG_0001.jpg').write_bytes(b'photo')
+        self.day = self.root / 'archive' / '2024' / 'May' / '01-Wednesday'
+        self.day.mkdir(parents=True)
+        self.item = {'source': str(self.root / 'card' / 'IMG_0001.jpg'),
+                     'jpg_path': str(self.root / 'card' / 'IMG_0001.jpg'), 'raw_path': None}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def plan_item(self, settings):
+        settings = dict(settings, dest_dir=str(self.root / 'archive'), obsidian_dir=str(self.root / 'vault'),
+                        base_name='Test_', start_number=1)
+        plan = planner.plan_batch([self.item], settings, {self.item['source']: datetime(2024, 5, 1)})
+        return plan['items'][0], settings
+
+    def test_recheck_skips_a_file_that_appeared_after_planning(self):
+        item, settings = self.plan_item({'on_collision': 'skip'})
+        Path(item['dest_jpg']).write_bytes(b'PRECIOUS')
+        item, conflicts = planner.recheck_item(item, settings)
+        self.assertEqual(len(conflicts), 1)
+        self.assertEqual(Path(item['dest_jpg']).read_bytes(), b'PRECIOUS')
+
+    def test_recheck_renames_under_rename_policy(self):
+        item, settings = self.plan_item({'on_collision': 'rename'})
+        Path(item['dest_jpg']).write_bytes(b'PRECIOUS')
+        item, conflicts = planner.recheck_item(item, settings)
+        self.assertEqual(conflicts, [])
+        self.assertEqual(Path(item['dest_jpg']).name, 'Test_001_2.jpg')
+        self.assertEqual(Path(item['rendition']).name, 'Test_001_2-R.jpg')
+
+    def test_transfer_refuses_to_replace_a_file(self):
+        (self.day / 'Test_001.jpg').write_bytes(b'PRECIOUS')
+        with self.assertRaises(FileExistsError):
+            transfer.transfer(self.item['jpg_path'], self.day / 'Test_001.jpg', {'verify': 'all'})
+        self.assertEqual((self.day / 'Test_001.jpg').read_bytes(), b'PRECIOUS')
+        self.assertTrue(Path(self.item['jpg_path']).exists())
+        self.assertEqual(list(self.day.glob('*.part')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
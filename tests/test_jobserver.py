@@ -0,0 +1,99 @@
+"""End-to-end tests for the job server on a localhost port and a Unix socket."""
+import http.client
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import jobserver
+
+
+@unittest.skipUnless(importlib.util.find_spec('PIL'), "the ingest engine needs Pillow")
+class JobServerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.server = jobserver.JobServer(self.root / 'jobs.db', workers=1, port=0,
+                                          socket_path=str(self.root / 'jobs.sock'))
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+    def make_batch(self):
+        from PIL import Image
+        source = self.root / 'card'
+        source.mkdir()
+        Image.new('RGB', (640, 480), (200, 80, 40)).save(source / 'IMG_0001.jpg')
+        selection = [{'jpg_path': str(source / 'IMG_0001.jpg'), 'raw_path': None}]
+        settings = {'dest_dir': str(self.root / 'archive'), 'obsidian_dir': str(self.root / 'vault'),
+                    'resize_w': 200, 'resize_h': 200, 'base_name': 'Test_', 'start_number': 1,
+                    'tags': [], 'on_collision': 'skip'}
+        return selection, settings
+
+    def test_submit_streams_progress_until_done(self):
+        selection, settings = self.make_batch()
+        job_id = jobserver.submit_job(self.server.url, selection, settings)
+        updates = []
+        job = jobserver.wait_for_job(self.server.url, job_id, on_progress=updates.append)
+
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['done'], 1)
+        self.assertEqual([r['status'] for r in job['results']], ['ok'])
+        self.assertGreaterEqual(len(updates), 1)
+        self.assertEqual(len(list((self.root / 'archive').rglob('Test_001.jpg'))), 1)
+        self.assertEqual(len(list((self.root / 'vault').rglob('Test_001-R.jpg'))), 1)
+        self.assertFalse(Path(selection[0]['jpg_path']).exists())
+
+    def test_dead_worker_does_not_stop_the_queue(self):
+        # Kill a worker process the way a crash in LibRaw would; the pool is broken afterwards.
+        with self.assertRaises(Exception):
+            self.server.queue.executor.submit(os._exit, 1).result(timeout=60)
+        selection, settings = self.make_batch()
+        job_id = jobserver.submit_job(self.server.url, selection, settings)
+        deadline = time.time() + 60
+        while jobserver.get_job(self.server.url, job_id)['status'] not in jobserver.FINISHED_STATES:
+            self.assertLess(time.time(), deadline, "job never finished")
+            time.sleep(0.2)
+        self.assertEqual(jobserver.get_job(self.server.url, job_id)['status'], 'done')
+
+    def test_unknown_job_is_404(self):
+        with self.assertRaisesRegex(RuntimeError, '404'):
+            jobserver.get_job(self.server.url, 9999)
+        host, port = self.server.url[len('http://'):].split(':')
+        conn = http.client.HTTPConnection(host, int(port), timeout=10)
+        conn.request('GET', '/jobs/9999/events')
+        self.assertEqual(conn.getresponse().status, 404)
+        conn.close()
+
+    def test_unix_socket(self):
+        self.assertEqual(jobserver._request(f"unix:{self.root / 'jobs.sock'}", 'GET', '/jobs'), [])
+
+
+class BindingTest(unittest.TestCase):
+    def test_socket_only_server_has_no_tcp_listener(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            server = jobserver.JobServer(Path(tmp) / 'jobs.db', workers=1, port=None,
+                                         socket_path=str(Path(tmp) / 'jobs.sock'))
+            try:
+                self.assertIsNone(server.url)
+            finally:
+                server.stop()
+
+    def test_default_host_is_loopback(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            server = jobserver.JobServer(Path(tmp) / 'jobs.db', workers=1, port=0)
+            try:
+                self.assertTrue(server.url.startswith('http://127.0.0.1:'))
+            finally:
+                server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
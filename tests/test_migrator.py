@@ -0,0 +1,59 @@
+"""Staging-tier migration: files wait, without using up retries, while the archive is offline."""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import migrator
+
+
+class MigratorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.db = self.root / 'migration.db'
+        self.archive = self.root / 'archive'
+        self.archive.mkdir()
+        self.staged = self.root / 'staging' / '2024' / 'IMG_0001.jpg'
+        self.staged.parent.mkdir(parents=True)
+        self.staged.write_bytes(b'photo' * 1000)
+        self.destination = self.archive / '2024' / 'IMG_0001.jpg'
+        migrator.enqueue(self.staged, self.destination, {'dest_dir': str(self.archive)}, db_path=self.db)
+        self.migrator = migrator.Migrator(db_path=self.db, retries=1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def row(self):
+        with migrator._connect(self.db) as conn:
+            return conn.execute("SELECT * FROM migrations").fetchone()
+
+    def test_migrates_to_the_archive(self):
+        self.assertTrue(self.migrator.run_once())
+        self.assertEqual(self.row()['status'], 'done')
+        self.assertEqual(self.destination.read_bytes(), b'photo' * 1000)
+        self.assertFalse(self.staged.exists())
+
+    def test_empty_mount_point_is_not_the_archive(self):
+        # The archive's folder is still there, but on another device than when the file was queued.
+        with migrator._connect(self.db) as conn:
+            conn.execute("UPDATE migrations SET archive_dev = archive_dev + 1")
+        self.migrator.run_once()
+        row = self.row()
+        self.assertEqual((row['status'], row['attempts']), ('pending', 0))
+        self.assertFalse(self.destination.parent.exists())
+        self.assertTrue(self.staged.exists())
+        self.assertTrue(self.migrator.archives_offline())
+
+    def test_missing_archive_does_not_use_up_retries(self):
+        self.archive.rmdir()
+        self.migrator.run_once()
+        row = self.row()
+        self.assertEqual((row['status'], row['attempts']), ('pending', 0))
+        self.assertTrue(self.staged.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+"""Renditions fall back to JPEG when the configured format can't be written."""
+import importlib.util
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import renditions
+
+
+@unittest.skipUnless(importlib.util.find_spec('PIL'), "needs Pillow")
+class FallbackTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = renditions._available
+        renditions._available = ['jpeg', 'progressive-jpeg']
+
+    def tearDown(self):
+        renditions._available = self.saved
+
+    def test_unwritable_format_falls_back_to_jpeg(self):
+        from PIL import Image
+        settings = {'rendition_format': 'avif'}
+        self.assertEqual(renditions.extension(settings), '.jpg')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'IMG-R.jpg'
+            renditions.save_rendition(Image.new('RGB', (32, 32)), path, settings)
+            with Image.open(path) as img:
+                self.assertEqual(img.format, 'JPEG')
+
+
+@unittest.skipUnless(importlib.util.find_spec('PIL'), "needs Pillow")
+class BenchmarkTest(unittest.TestCase):
+    def test_unreadable_samples_are_skipped(self):
+        from PIL import Image
+        with tempfile.TemporaryDirectory() as tmp:
+            good, bad = Path(tmp) / 'good.jpg', Path(tmp) / 'bad.jpg'
+            Image.new('RGB', (64, 48), (200, 80, 40)).save(good)
+            bad.write_bytes(b'not a photo')
+            results = renditions.benchmark([bad, good, Path(tmp) / 'missing.jpg'], (32, 32), formats=['jpeg'])
+        self.assertEqual({r['images'] for r in results}, {1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+"""Burst grouping: similar frames group only when shot close together."""
+import importlib.util
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@unittest.skipUnless(importlib.util.find_spec('PIL') and importlib.util.find_spec('numpy'), "needs Pillow and NumPy")
+class GroupBurstsTest(unittest.TestCase):
+    def entry(self, key, captured, flipped_bits=0, focus=0.0):
+        flip = (1 << flipped_bits) - 1
+        return {'key': key, 'phash': 0xF0F0F0F0F0F0F0F0 ^ flip, 'dhash': 0xFFFF0000FFFF0000 ^ flip,
+                'captured': captured, 'focus': focus}
+
+    def test_groups_close_frames_sharpest_first(self):
+        import similarity
+        entries = [self.entry('a', 100.0, 0, focus=1.0), self.entry('b', 100.5, 3, focus=5.0),
+                   self.entry('c', 101.0, 40), self.entry('d', 200.0, 0)]
+        self.assertEqual(similarity.group_bursts(entries), [['b', 'a'], ['c'], ['d']])
+
+    def test_frames_further_apart_than_the_gap_are_not_grouped(self):
+        import similarity
+        entries = [self.entry(str(i), i * 3.0) for i in range(5)]
+        self.assertEqual(len(similarity.group_bursts(entries, max_gap_seconds=2.0)), 5)
+        self.assertEqual(len(similarity.group_bursts(entries, max_gap_seconds=3.0)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
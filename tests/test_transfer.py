@@ -0,0 +1,48 @@
+"""Verified transfers: manifests, read-back mismatches and the checksum fallback."""
+import hashlib
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import transfer
+
+
+class TransferTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.src = self.root / 'IMG_0001.jpg'
+        self.src.write_bytes(b'photo' * 1000)
+        self.day = self.root / 'archive' / '2024' / 'May' / '01-Wednesday'
+        self.day.mkdir(parents=True)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_copy_is_recorded_in_the_manifest(self):
+        digest = transfer.transfer(self.src, self.day / 'Test_001.jpg', {'verify': 'all'}, keep_source=True)
+        self.assertEqual(digest, hashlib.blake2b(self.src.read_bytes()).hexdigest())
+        self.assertEqual(transfer.read_manifest(self.day / 'checksums.b2'), {'Test_001.jpg': digest})
+        self.assertEqual(transfer.audit(self.root / 'archive'), [])
+
+    def test_read_back_mismatch_removes_the_copy(self):
+        with mock.patch.object(transfer, 'hash_file', return_value='0' * 128):
+            with self.assertRaises(transfer.TransferError):
+                transfer.transfer(self.src, self.day / 'Test_001.jpg', {'verify': 'all'}, keep_source=True)
+        self.assertFalse((self.day / 'Test_001.jpg').exists())
+        self.assertFalse((self.day / 'checksums.b2').exists())
+        self.assertTrue(self.src.exists())
+
+    def test_missing_xxhash_falls_back_to_blake2b(self):
+        with mock.patch.object(transfer.importlib.util, 'find_spec', return_value=None):
+            self.assertEqual(transfer.resolve_algorithm({'checksum_algorithm': 'xxh128'}), 'blake2b')
+            transfer.transfer(self.src, self.day / 'Test_001.jpg', {'checksum_algorithm': 'xxh128'}, keep_source=True)
+        self.assertTrue((self.day / 'checksums.b2').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
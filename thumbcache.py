@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Persistent thumbnail cache.
+
+Stores the decoded thumbnail (as PNG bytes) and a small dict of per-image
+metadata (perceptual hashes, capture time, ...) for every file we have shown,
+keyed by the file's identity (path, size and mtime). A file that changes on
+disk simply stops matching its old entry.
+"""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+CACHE_DIR = Path.home() / ".cache" / "PhotoFlow"
+CACHE_FILE = CACHE_DIR / "thumbnails.db"
+
+_connection = None
+_lock = threading.Lock()
+
+
+def _connect():
+    global _connection
+    if _connection is None:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # One shared connection, serialised by _lock: thumbnails are loaded from worker threads.
+        _connection = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+        _connection.execute("CREATE TABLE IF NOT EXISTS thumbs (key TEXT PRIMARY KEY, png BLOB, meta TEXT)")
+    return _connection
+
+
+def file_key(file_path):
+    """Returns the identity key for a file, or None if it cannot be stat'ed."""
+    try:
+        stat = Path(file_path).stat()
+    except OSError:
+        return None
+    return f"{Path(file_path).resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def get(file_path):
+    """Returns (png_bytes, meta_dict) for a file. Either may be None/empty on a miss."""
+    key = file_key(file_path)
+    if key is None:
+        return None, {}
+    with _lock:
+        row = _connect().execute("SELECT png, meta FROM thumbs WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None, {}
+    return row[0], json.loads(row[1] or "{}")
+
+
+def get_meta(file_path):
+    return get(file_path)[1]
+
+
+def has_thumbnail(file_path):
+    """True if the thumbnail and its hashes are cached, so showing the file won't read it."""
+    key = file_key(file_path)
+    if key is None:
+        return False
+    with _lock:
+        row = _connect().execute("SELECT png IS NOT NULL, meta FROM thumbs WHERE key = ?", (key,)).fetchone()
+    return bool(row and row[0] and 'phash' in json.loads(row[1] or "{}"))
+
+
+def put_thumbnail(file_path, png_bytes):
+    key = file_key(file_path)
+    if key is None:
+        return
+    with _lock:
+        conn = _connect()
+        conn.execute("INSERT INTO thumbs (key, png, meta) VALUES (?, ?, '{}') "
+                     "ON CONFLICT(key) DO UPDATE SET png = excluded.png", (key, png_bytes))
+        conn.commit()
+
+
+def update_meta(file_path, **values):
+    """Merges values into the metadata stored for a file."""
+    key = file_key(file_path)
+    if key is None:
+        return
+    with _lock:
+        conn = _connect()
+        row = conn.execute("SELECT meta FROM thumbs WHERE key = ?", (key,)).fetchone()
+        meta = json.loads(row[0] or "{}") if row else {}
+        meta.update(values)
+        conn.execute("INSERT INTO thumbs (key, png, meta) VALUES (?, NULL, ?) "
+                     "ON CONFLICT(key) DO UPDATE SET meta = excluded.meta", (key, json.dumps(meta)))
+        conn.commit()
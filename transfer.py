@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""Verified transfers into the archive.
+
+Files are copied with a buffered read loop that feeds the same buffer to a
+strong hash (BLAKE2b, or xxHash's XXH128 when configured and installed), so
+the checksum costs no extra read of the source. The destination is then read
+back (always, on a random sample, or never) with its page cache dropped
+first, so the comparison sees what actually reached the disk.
+
+Every checksum is appended to a manifest in the destination's day folder,
+in the format `b2sum -c` / `xxhsum -c` understand, so the archive can be
+audited for bit rot later without the source:
+
+    python3 transfer.py audit /media/user/PhotoArchive
+"""
+import errno
+import hashlib
+import importlib.util
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+
+import readorder
+
+CHUNK_SIZE = 1024 * 1024
+MANIFEST_NAMES = {'blake2b': 'checksums.b2', 'xxh128': 'checksums.xxh128'}
+DEFAULT_ALGORITHM = 'blake2b'
+# VerifyTransfers: 'all' reads every copy back, 'sample' a random VerifySampleRate fraction, 'none' none.
+DEFAULT_VERIFY = 'all'
+DEFAULT_SAMPLE_RATE = 0.1
+
+_manifest_lock = threading.Lock()
+_warned = set()
+
+
+class TransferError(Exception):
+    """Raised when a copy does not read back with the checksum it was written with."""
+
+
+def resolve_algorithm(settings):
+    """The checksum algorithm the given settings actually use: the configured one, or BLAKE2b if it isn't available."""
+    algorithm = settings.get('checksum_algorithm', DEFAULT_ALGORITHM)
+    if algorithm not in MANIFEST_NAMES:
+        return DEFAULT_ALGORITHM
+    if algorithm == 'xxh128' and importlib.util.find_spec('xxhash') is None:
+        if algorithm not in _warned:
+            _warned.add(algorithm)
+            print("⚠️  xxhash is not installed (pip install xxhash); using BLAKE2b checksums instead.")
+        return DEFAULT_ALGORITHM
+    return algorithm
+
+
+def new_hasher(algorithm):
+    if algorithm == 'xxh128':
+        import xxhash
+        return xxhash.xxh128()
+    return hashlib.blake2b()
+
+
+def _drop_cache(fd):
+    # Evict the file from the page cache so the next read really comes from the device.
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _place(src, dst, overwrite):
+    """Renames src to dst. Unless overwrite, raises FileExistsError instead of replacing an existing dst."""
+    if overwrite:
+        os.replace(src, dst)
+        return
+    try:
+        # A hard link fails atomically if dst exists, where a rename would silently replace it.
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError:
+        # No hard links on this filesystem (FAT, some network shares): check, then rename.
+        if os.path.exists(dst):
+            raise FileExistsError(errno.EEXIST, "File exists", str(dst))
+        os.replace(src, dst)
+        return
+    os.remove(src)
+
+
+def copy_with_hash(src, dst, algorithm=DEFAULT_ALGORITHM, max_bytes_per_second=None, overwrite=True):
+    """Copies src to dst and returns the hex digest of the bytes written, from one read of src.
+
+    With max_bytes_per_second, the copy sleeps as needed to stay under that rate.
+    Without overwrite, raises FileExistsError if dst exists.
+    """
+    hasher = new_hasher(algorithm)
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    part = dst.with_name(f".{dst.name}.part")
+    copied, start = 0, time.monotonic()
+    with readorder.open_sequential(src) as fin, open(part, 'wb') as fout:
+        while n := fin.readinto(buffer):
+            hasher.update(view[:n])
+            fout.write(view[:n])
+            copied += n
+            if max_bytes_per_second:
+                ahead = copied / max_bytes_per_second - (time.monotonic() - start)
+                if ahead > 0: time.sleep(ahead)
+        # Done with the source (during an ingest, the copy in the temp folder): drop it
+        # from the page cache while it is still open, before it is moved or removed.
+        _drop_cache(fin.fileno())
+        fout.flush()
+        os.fsync(fout.fileno())
+        _drop_cache(fout.fileno())
+    shutil.copystat(src, part)
+    # Only a complete copy ever appears under the final name.
+    try:
+        _place(part, dst, overwrite)
+    except FileExistsError:
+        part.unlink(missing_ok=True)
+        raise
+    return hasher.hexdigest()
+
+
+def hash_file(path, algorithm=DEFAULT_ALGORITHM):
+    hasher = new_hasher(algorithm)
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb') as f:
+        while n := f.readinto(buffer):
+            hasher.update(view[:n])
+        _drop_cache(f.fileno())
+    return hasher.hexdigest()
+
+
+def _should_verify(settings):
+    mode = settings.get('verify', DEFAULT_VERIFY)
+    if mode == 'sample':
+        return random.random() < settings.get('verify_sample_rate', DEFAULT_SAMPLE_RATE)
+    return mode != 'none'
+
+
+def record_checksum(path, digest, algorithm=DEFAULT_ALGORITHM):
+    """Appends a checksum line to the manifest in path's folder."""
+    manifest = Path(path).parent / MANIFEST_NAMES[algorithm]
+    with _manifest_lock, open(manifest, 'a') as f:
+        f.write(f"{digest}  {Path(path).name}\n")
+
+
+def transfer(src, dst, settings, keep_source=False, expected=None, max_bytes_per_second=None, manifest=True):
+    """Moves (or, with keep_source, copies) src to dst with verification. Returns the checksum.
+
+    expected is a checksum src must still have (e.g. from an earlier hop);
+    manifest=False skips the manifest entry, for intermediate copies.
+    Raises TransferError if the read-back does not match, and FileExistsError
+    if dst exists and settings['on_collision'] isn't 'overwrite'; the source
+    is left untouched in both cases.
+    """
+    src, dst = Path(src), Path(dst)
+    algorithm = resolve_algorithm(settings)
+    overwrite = settings.get('on_collision') == 'overwrite'
+    if not overwrite and dst.exists():
+        raise FileExistsError(errno.EEXIST, "Refusing to replace an existing file", str(dst))
+    if not keep_source and os.stat(src).st_dev == os.stat(dst.parent).st_dev:
+        # Same filesystem: a rename moves no data, so there is no copy to verify.
+        _place(src, dst, overwrite)
+        digest = hash_file(dst, algorithm)
+        if expected and digest != expected:
+            os.replace(dst, src)
+            raise TransferError(f"{src.name}: checksum {digest[:16]}… does not match {expected[:16]}…")
+    else:
+        digest = copy_with_hash(src, dst, algorithm, max_bytes_per_second, overwrite)
+        if expected and digest != expected:
+            dst.unlink(missing_ok=True)
+            raise TransferError(f"{src.name}: checksum {digest[:16]}… does not match {expected[:16]}…")
+        if _should_verify(settings):
+            readback = hash_file(dst, algorithm)
+            if readback != digest:
+                dst.unlink(missing_ok=True)
+                raise TransferError(f"{dst.name}: read-back checksum {readback[:16]}… does not match {digest[:16]}…")
+        if not keep_source:
+            os.remove(src)
+    if manifest:
+        record_checksum(dst, digest, algorithm)
+    return digest
+
+
+def read_manifest(manifest):
+    """Returns {filename: digest}; later lines win, so a re-ingested file uses its newest checksum."""
+    entries = {}
+    with open(manifest) as f:
+        for line in f:
+            digest, _, name = line.rstrip('\n').partition('  ')
+            if name:
+                entries[name] = digest
+    return entries
+
+
+def audit(root):
+    """Re-hashes every file listed in the manifests under root. Returns a list of (path, problem)."""
+    problems = []
+    for algorithm, manifest_name in MANIFEST_NAMES.items():
+        for manifest in Path(root).rglob(manifest_name):
+            for name, digest in read_manifest(manifest).items():
+                path = manifest.parent / name
+                if not path.exists():
+                    problems.append((path, 'missing'))
+                elif hash_file(path, algorithm) != digest:
+                    problems.append((path, 'checksum mismatch'))
+    return problems
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'audit':
+        print("Usage: python3 transfer.py audit ARCHIVE_DIR")
+        sys.exit(2)
+    problems = audit(sys.argv[2])
+    for path, problem in problems:
+        print(f"❗️ {path}: {problem}")
+    print("✅ Archive verified." if not problems else f"❗️ {len(problems)} problem(s) found.")
+    sys.exit(1 if problems else 0)